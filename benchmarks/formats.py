@@ -0,0 +1,113 @@
+"""
+Format table benchmark. Builds synthetic yt-dlp format lists shaped like a
+livestream archive (hundreds of HLS/DASH variants per resolution and codec)
+and times core.formats.FormatTable against the old string-building loop.
+
+    python benchmarks/formats.py
+    python benchmarks/formats.py --formats 800 --videos 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.formats import FormatTable
+
+HEIGHTS = [144, 240, 360, 480, 720, 1080, 1440, 2160]
+VCODECS = ["avc1.64001F", "vp9", "av01.0.08M.08", "avc1.4d401e"]
+ACODECS = ["mp4a.40.2", "opus"]
+PROTOCOLS = ["https", "m3u8_native", "http_dash_segments"]
+
+
+def make_formats(count, rng):
+    formats = []
+    for i in range(count):
+        if rng.random() < 0.15:
+            abr = rng.choice([48, 64, 96, 128, 160, 256]) + rng.random()
+            formats.append({"format_id": f"a{i}", "vcodec": "none", "acodec": rng.choice(ACODECS), "abr": abr,
+                            "filesize": rng.randrange(10 ** 6, 10 ** 8) if rng.random() < 0.5 else None,
+                            "protocol": rng.choice(PROTOCOLS)})
+        else:
+            formats.append({"format_id": f"v{i}", "vcodec": rng.choice(VCODECS), "acodec": "none",
+                            "height": rng.choice(HEIGHTS), "fps": rng.choice([25, 30, 50, 60]),
+                            "tbr": rng.uniform(100, 20000), "filesize_approx": rng.randrange(10 ** 6, 10 ** 10),
+                            "protocol": rng.choice(PROTOCOLS)})
+    return formats
+
+
+def old_build(formats):
+    mp4_options = []
+    mp3_options = []
+    seen_res = set()
+    for f in formats:
+        format_id = f.get('format_id')
+        filesize = f.get('filesize') or f.get('filesize_approx')
+        if filesize:
+            filesize_str = f"{filesize / (1024 * 1024):.1f} MB"
+        else:
+            filesize_str = "Unknown Size"
+        if f.get('vcodec') == 'none' and f.get('acodec') != 'none':
+            abr = f.get('abr')
+            if abr:
+                mp3_options.append({"resolution": f"{int(abr)}kbps", "filesize": filesize_str, "itag": format_id, "type": "audio"})
+        elif f.get('vcodec') != 'none':
+            height = f.get('height')
+            if not height:
+                continue
+            res_str = f"{height}p"
+            if res_str not in seen_res:
+                mp4_options.append({"resolution": res_str, "filesize": filesize_str, "itag": format_id, "type": "video"})
+                seen_res.add(res_str)
+
+    def res_sort_key(item):
+        r = item['resolution'].replace('p', '')
+        return int(r) if r.isdigit() else 0
+
+    def audio_sort_key(item):
+        r = item['resolution'].replace('kbps', '')
+        return int(r) if r.isdigit() else 0
+
+    mp4_options.sort(key=res_sort_key)
+    mp3_options.sort(key=audio_sort_key)
+    return mp4_options, mp3_options
+
+
+def new_build(formats):
+    table = FormatTable(formats)
+    return table.video_streams(), table.audio_streams()
+
+
+def timed(fn, lists):
+    start = time.perf_counter()
+    results = [fn(formats) for formats in lists]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", type=int, default=400, help="Formats per video")
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lists = [make_formats(args.formats, rng) for _ in range(args.videos)]
+
+    old_time, _ = timed(old_build, lists)
+    new_time, results = timed(new_build, lists)
+    start = time.perf_counter()
+    labels = sum(len([s.label for s in video + audio]) for video, audio in results)
+    label_time = time.perf_counter() - start
+
+    print(f"{args.videos} videos x {args.formats} formats")
+    print(f"    old loop     {old_time * 1000 / args.videos:8.3f} ms/video")
+    print(f"    FormatTable  {new_time * 1000 / args.videos:8.3f} ms/video  (best variant per resolution by score)")
+    print(f"    labels       {label_time * 1000 / args.videos:8.3f} ms/video  ({labels} menu strings, built on demand)")
+
+
+if __name__ == "__main__":
+    main()
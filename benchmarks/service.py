@@ -0,0 +1,203 @@
+"""
+Service mode harness. Starts DownloadService and its HTTP server on
+localhost with a stub handler that fakes extraction and downloads with
+simulated latency, so it needs no network or ffmpeg. Several clients fetch,
+submit and cancel jobs over the real HTTP API while one listens to the event
+stream; the run checks what every client saw and times the requests.
+
+    python benchmarks/service.py
+    python benchmarks/service.py --clients 20 --jobs 10 --keep-finished 50
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.downloader import VideoInfo
+from core.formats import AUDIO, VIDEO, Stream
+from ui.server import DownloadService, make_server
+
+TOKEN = "harness"
+
+
+class StubHandler:
+    """
+    Stands in for DownloaderHandler: resolve() sleeps like an extraction,
+    download_stream() reports progress in steps and honors its CancelToken.
+    Counts extractions, and downloads that had to extract again.
+    """
+    def __init__(self, extract_latency, download_time, steps=20):
+        self.extract_latency = extract_latency
+        self.download_time = download_time
+        self.steps = steps
+        self.extractions = 0
+        self.re_extractions = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, url, trace=None):
+        time.sleep(self.extract_latency)
+        with self._lock:
+            self.extractions += 1
+        video_id = url.rsplit("=", 1)[1]
+        streams = [Stream("22", VIDEO, 720, 30), Stream("137", VIDEO, 1080, 30, filesize=50 * 1024 ** 2)] # Ascending, like resolve()
+        return VideoInfo(f"Video {video_id}", "", 60, "Harness", streams, [Stream("140", AUDIO, abr=128)]), {"id": video_id, "title": f"Video {video_id}"}
+
+    def download_stream(self, format_id, download_path, progress_callback, complete_callback, url=None, info=None, cancel=None, **kwargs):
+        if info is None:
+            with self._lock:
+                self.re_extractions += 1
+            time.sleep(self.extract_latency)
+        total = 1024 * 1024
+        for step in range(1, self.steps + 1):
+            if cancel:
+                cancel.check()
+            time.sleep(self.download_time / self.steps)
+            progress_callback(step * 100 / self.steps, total * step // self.steps, total)
+        return os.path.join(download_path, f"{url.rsplit('=', 1)[1]}.{format_id}.mp4")
+
+
+class Client:
+    def __init__(self, base, token=TOKEN, name="harness"):
+        self.base = base
+        self.token = token
+        self.name = name # Sent as X-Client: each client gets its own queue group
+        self.timings = []
+
+    def call(self, method, path, body=None):
+        request = urllib.request.Request(
+            self.base + path,
+            method=method,
+            data=None if body is None else json.dumps(body).encode("utf-8"),
+            headers={"Authorization": f"Bearer {self.token}", "Content-Type": "application/json", "X-Client": self.name},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, data = response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            status, data = e.code, json.loads(e.read())
+        self.timings.append((method, path.split("?")[0].rstrip("0123456789"), time.perf_counter() - start))
+        return status, data
+
+
+def listen(base, events, stop):
+    # Collects the last state of every job seen on the event stream
+    with urllib.request.urlopen(f"{base}/api/events?token={TOKEN}") as stream:
+        event = None
+        for line in stream:
+            line = line.decode("utf-8").strip()
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event == "job":
+                job = json.loads(line[len("data: "):])
+                events[job["id"]] = job["state"]
+            if stop.is_set():
+                return
+
+
+def run_client(client, index, args, submitted, failures):
+    for n in range(args.jobs):
+        url = f"https://www.youtube.com/watch?v=c{index:04d}j{n:05d}"
+        status, info = client.call("GET", "/api/fetch?url=" + urllib.request.quote(url, safe=""))
+        if status != 200 or info["video"][-1]["format_id"] != "137":
+            failures.append(f"fetch {url}: {status} {info}")
+            continue
+        status, job = client.call("POST", "/api/jobs", {"url": url, "format": info["video"][-1]["format_id"]})
+        if status != 201:
+            failures.append(f"submit {url}: {status} {job}")
+            continue
+        cancel = n % args.cancel_every == 0 if args.cancel_every else False
+        if cancel:
+            client.call("DELETE", f"/api/jobs/{job['id']}")
+        submitted.append((job["id"], cancel))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=5, help="Jobs per client")
+    parser.add_argument("--workers", type=int, default=4, help="Download workers of the service")
+    parser.add_argument("--cancel-every", type=int, default=4, help="Cancel every Nth job of each client (0: none)")
+    parser.add_argument("--keep-finished", type=int, default=1000)
+    parser.add_argument("--extract-latency", type=float, default=0.2, help="Seconds per simulated extraction")
+    parser.add_argument("--download-time", type=float, default=0.3, help="Seconds per simulated download")
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp()
+    handler = StubHandler(args.extract_latency, args.download_time)
+    service = DownloadService(handler, out_dir, workers=args.workers, postprocess_workers=1, keep_finished=args.keep_finished)
+    server = make_server(service, port=0, token=TOKEN)
+    threading.Thread(target=server.serve_forever, name="service", daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    failures = []
+    try:
+        status, _ = Client(base, token="wrong").call("GET", "/api/jobs")
+        if status != 401:
+            failures.append(f"wrong token got {status}, expected 401")
+
+        events, stop = {}, threading.Event()
+        threading.Thread(target=listen, args=(base, events, stop), daemon=True).start()
+
+        clients = [Client(base, name=f"client-{i}") for i in range(args.clients)]
+        submitted = []
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run_client, args=(c, i, args, submitted, failures)) for i, c in enumerate(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        service.queue.join()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5) # Let the last events arrive
+        stop.set()
+
+        status, listed = Client(base).call("GET", "/api/jobs")
+        states = {job["id"]: job["state"] for job in listed}
+        for job_id, cancelled in submitted:
+            state = states.get(job_id)
+            if state is None:
+                continue # Forgotten under --keep-finished
+            # A cancel can arrive after the job has finished
+            allowed = ("cancelled", "finished") if cancelled else ("finished",)
+            if state not in allowed:
+                failures.append(f"job {job_id} is {state}, expected {' or '.join(allowed)}")
+            if events.get(job_id) != state:
+                failures.append(f"job {job_id}: event stream says {events.get(job_id)}, listing says {state}")
+        if len(listed) > args.keep_finished:
+            failures.append(f"{len(listed)} jobs listed, more than --keep-finished {args.keep_finished}")
+        if handler.re_extractions:
+            failures.append(f"{handler.re_extractions} downloads extracted again instead of reusing their fetch")
+
+        total = args.clients * args.jobs
+        print(f"{args.clients} clients x {args.jobs} jobs, {args.workers} workers: {elapsed:.2f} s")
+        print(f"    jobs         {len(submitted)} submitted, {sum(1 for s in states.values() if s == 'finished')} finished,"
+              f" {sum(1 for s in states.values() if s == 'cancelled')} cancelled, {len(listed)} listed")
+        print(f"    extractions  {handler.extractions} for {total} fetches, {handler.re_extractions} repeated by downloads")
+        timings = [t for c in clients for t in c.timings]
+        for method, path in sorted({(m, p) for m, p, _ in timings}):
+            durations = sorted(d for m, p, d in timings if (m, p) == (method, path))
+            print(f"    {method:<6} {path:<14} median {durations[len(durations) // 2] * 1000:7.1f} ms"
+                  f"  max {durations[-1] * 1000:7.1f} ms  ({len(durations)} requests)")
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Startup benchmark. Measures import cost of each entry point (via -X importtime)
+and, when a display is available, time until the main window is drawn.
+
+    python benchmarks/startup.py                      # print results
+    python benchmarks/startup.py --save base.json     # record a baseline
+    python benchmarks/startup.py --compare base.json  # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> import statement measured in a fresh interpreter
+ENTRY_POINTS = {
+    "gui_import": "from ui.app import App",
+    "cli_import": "import ui.cli",
+    "handler_import": "from core.downloader import DownloaderHandler",
+}
+
+# Modules that must not be loaded by a given entry point
+FORBIDDEN = {
+    "gui_import": ["yt_dlp"],
+    "cli_import": ["customtkinter", "tkinter", "PIL", "yt_dlp"],
+    "handler_import": ["yt_dlp"],
+}
+
+FIRST_FRAME_SCRIPT = """
+import sys, time
+t0 = time.perf_counter()
+from ui.app import App
+app = App()
+app.update()
+print(time.perf_counter() - t0, 'yt_dlp' in sys.modules)
+app.destroy()
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Returns (total seconds, {top-level module: cumulative seconds}, set of all modules).
+    """
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        modules.add(name.strip())
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative_us) / 1e6
+    return sum(top_level.values()), top_level, modules
+
+
+def measure_import(statement):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure_first_frame():
+    result = subprocess.run([sys.executable, "-c", FIRST_FRAME_SCRIPT], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, None # No display, or GUI deps missing
+    seconds, yt_dlp_loaded = result.stdout.split()[-2:]
+    return float(seconds), yt_dlp_loaded == "True"
+
+
+def run(repeat):
+    results = {}
+    for name, statement in ENTRY_POINTS.items():
+        try:
+            runs = [measure_import(statement) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"{name}: skipped ({str(e).splitlines()[0]})", file=sys.stderr)
+            continue
+
+        results[name] = statistics.median(total for total, _, _ in runs)
+        _, top_level, modules = runs[-1]
+
+        slowest = sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        print(f"{name}: {results[name] * 1000:.1f} ms")
+        for module, seconds in slowest:
+            print(f"    {module:<40} {seconds * 1000:8.1f} ms")
+
+        leaked = [m for m in FORBIDDEN.get(name, []) if m in modules]
+        if leaked:
+            print(f"    WARNING: imports {', '.join(leaked)}")
+
+    frames = [measure_first_frame() for _ in range(repeat)]
+    if frames[0][0] is not None:
+        results["first_frame"] = statistics.median(f[0] for f in frames)
+        print(f"first_frame: {results['first_frame'] * 1000:.1f} ms")
+        if any(f[1] for f in frames):
+            print("    WARNING: yt_dlp was imported before the first frame")
+    else:
+        print("first_frame: skipped (no display or GUI dependencies)", file=sys.stderr)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = False
+        for name, seconds in results.items():
+            base = baseline.get(name)
+            if base and seconds > base * (1 + args.tolerance):
+                print(f"REGRESSION {name}: {base * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+                regressed = True
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
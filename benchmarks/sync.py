@@ -0,0 +1,148 @@
+"""
+Incremental sync benchmark. Runs ChannelSync and the real
+DownloaderHandler.iter_entries against a fake YoutubeDL whose
+extract_info(process=False) serves a channel from memory: its Videos and
+Shorts tabs are yt-dlp OnDemandPagedLists, newest first, with a simulated
+per-page latency. No network needed: a baseline of --videos entries, then
+syncs after --new-uploads new videos (and --new-shorts shorts) appear. Each
+sync should touch a page or two per tab however large the channel is.
+
+    python benchmarks/sync.py
+    python benchmarks/sync.py --videos 50000 --new-uploads 30
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yt_dlp.utils
+from core import downloader
+from core.cache import MetadataCache
+from core.download_queue import DownloadQueue, DownloadJob
+from core.library import DownloadIndex
+from core.sync import ArchiveIndex, ChannelSync
+
+CHANNEL = "https://www.youtube.com/@fake"
+
+
+class FakeChannel:
+    """
+    The extractor side: what YoutubeTabIE returns with extract_flat, a
+    playlist of tab url entries for the channel and a lazily paged playlist
+    of video url entries for each tab.
+    """
+    def __init__(self, videos, shorts, page_size, page_latency):
+        self.tabs = {"videos": [], "shorts": []}
+        self.page_size = page_size
+        self.page_latency = page_latency
+        self.pages_fetched = 0
+        self.next_id = 0
+        self.upload("videos", videos)
+        self.upload("shorts", shorts)
+
+    def upload(self, tab, count):
+        ids = [f"v{self.next_id + i:010d}" for i in range(count)]
+        self.next_id += count
+        self.tabs[tab][:0] = reversed(ids)
+
+    def extract(self, url):
+        path = url.rstrip("/")
+        if path == CHANNEL:
+            entries = [{"_type": "url", "ie_key": "YoutubeTab", "url": f"{CHANNEL}/{tab}", "title": tab} for tab in self.tabs]
+            return {"_type": "playlist", "id": "fake", "title": "Fake", "entries": entries}
+        tab = path.rsplit("/", 1)[1]
+        return {"_type": "playlist", "id": f"fake-{tab}", "title": tab,
+                "entries": yt_dlp.utils.OnDemandPagedList(lambda n: self._page(tab, n), self.page_size)}
+
+    def _page(self, tab, pagenum):
+        time.sleep(self.page_latency)
+        self.pages_fetched += 1
+        start = pagenum * self.page_size
+        for video_id in self.tabs[tab][start:start + self.page_size]:
+            yield {"_type": "url", "ie_key": "Youtube", "id": video_id, "title": video_id,
+                   "url": f"https://www.youtube.com/watch?v={video_id}"}
+
+
+def fake_yt_dlp(channel):
+    # Stands in for the yt_dlp module that load_yt_dlp() returns
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=True, process=True):
+            assert not download and not process, "sync only enumerates flat"
+            return channel.extract(url)
+
+    return types.SimpleNamespace(YoutubeDL=YoutubeDL, utils=yt_dlp.utils)
+
+
+class BenchHandler(downloader.DownloaderHandler):
+    """
+    The real handler, enumeration included; only the download is faked.
+    """
+    def __init__(self, data_dir):
+        super().__init__(cache=MetadataCache(os.path.join(data_dir, "metadata.db")),
+                         library=DownloadIndex(os.path.join(data_dir, "downloads.db")))
+        self.downloads = 0
+
+    def download_stream(self, format_id, download_path, progress_callback, complete_callback, **kwargs):
+        self.downloads += 1
+        return os.path.join(download_path, f"{kwargs['url'].rsplit('=', 1)[1]}.mp4")
+
+
+def run_sync(name, sync, queue, channel, handler):
+    pages, downloads = channel.pages_fetched, handler.downloads
+    start = time.perf_counter()
+    result = sync.sync(CHANNEL, lambda e: DownloadJob(e.url, "bestvideo", "out", title=e.title))
+    queue.join()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {elapsed:6.2f} s  scanned {result.scanned:>6}  new {result.new:>4}"
+          f"  pages {channel.pages_fetched - pages:>4}  downloads {handler.downloads - downloads:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=5000)
+    parser.add_argument("--shorts", type=int, default=500)
+    parser.add_argument("--new-uploads", type=int, default=12)
+    parser.add_argument("--new-shorts", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=30)
+    parser.add_argument("--page-latency", type=float, default=0.05, help="Seconds per page fetch")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        channel = FakeChannel(args.videos, args.shorts, args.page_size, args.page_latency)
+        downloader.load_yt_dlp = lambda: fake_yt_dlp(channel)
+        handler = BenchHandler(data_dir)
+        queue = DownloadQueue(handler, max_workers=3)
+        sync = ChannelSync(handler, queue, archive=ArchiveIndex(os.path.join(data_dir, "archive.db")))
+
+        start = time.perf_counter()
+        result = sync.mark_all(CHANNEL)
+        print(f"{'baseline (mark all)':<22} {time.perf_counter() - start:6.2f} s  scanned {result.scanned:>6}"
+              f"  pages {channel.pages_fetched:>4}")
+
+        channel.upload("videos", args.new_uploads)
+        channel.upload("shorts", args.new_shorts)
+        run_sync(f"after {args.new_uploads}+{args.new_shorts} uploads", sync, queue, channel, handler)
+        run_sync("no new uploads", sync, queue, channel, handler)
+        queue.shutdown()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
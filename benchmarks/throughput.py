@@ -0,0 +1,147 @@
+"""
+Throughput benchmark for the high-throughput download mode.
+
+Serves an HLS stream and a plain file from a local HTTP server that caps
+every connection at --per-connection-kbps, the way CDNs throttle single
+connections, then downloads both with the default options and with
+DownloadTuning.ydl_opts().
+
+    python benchmarks/throughput.py
+    python benchmarks/throughput.py --fragments 40 --fragment-kb 512
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.downloader import load_yt_dlp
+from core.tuning import DownloadTuning
+
+
+def make_handler(fragments, fragment_size, file_size, per_connection_bps):
+    fragment_body = os.urandom(fragment_size)
+    file_body = os.urandom(file_size)
+    playlist = "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:0\n"
+    playlist += "".join(f"#EXTINF:2.0,\nseg{i}.ts\n" for i in range(fragments))
+    playlist += "#EXT-X-ENDLIST\n"
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body, content_type, status=200, extra_headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Accept-Ranges", "bytes")
+            for name, value in extra_headers:
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command == "HEAD":
+                return
+            # Throttle this connection
+            chunk = 16 * 1024
+            try:
+                for offset in range(0, len(body), chunk):
+                    self.wfile.write(body[offset:offset + chunk])
+                    time.sleep(chunk / per_connection_bps)
+            except (BrokenPipeError, ConnectionResetError):
+                pass # The extractor probes the URL and hangs up early
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            if self.path == "/stream.m3u8":
+                self.send_response(200)
+                self.send_header("Content-Type", "application/vnd.apple.mpegurl")
+                self.send_header("Content-Length", str(len(playlist)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(playlist.encode())
+            elif self.path.startswith("/seg"):
+                self._send(fragment_body, "video/mp2t")
+            elif self.path == "/video.mp4":
+                byte_range = self.headers.get("Range")
+                if byte_range:
+                    start, _, end = byte_range.split("=", 1)[1].partition("-")
+                    start = int(start)
+                    end = min(int(end) if end else file_size - 1, file_size - 1)
+                    self._send(file_body[start:end + 1], "video/mp4", 206,
+                               [("Content-Range", f"bytes {start}-{end}/{file_size}")])
+                else:
+                    self._send(file_body, "video/mp4")
+            else:
+                self.send_error(404)
+
+    return Handler
+
+
+def timed_download(url, extra_opts):
+    out_dir = tempfile.mkdtemp()
+    opts = {
+        'format': 'best',
+        'outtmpl': os.path.join(out_dir, '%(id)s.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'overwrites': True,
+        'fixup': 'never',
+    }
+    opts.update(extra_opts)
+    try:
+        start = time.perf_counter()
+        with load_yt_dlp().YoutubeDL(opts) as ydl:
+            ydl.download([url])
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+        return elapsed, size
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fragments", type=int, default=20)
+    parser.add_argument("--fragment-kb", type=int, default=256)
+    parser.add_argument("--file-mb", type=int, default=8)
+    parser.add_argument("--per-connection-kbps", type=int, default=2048)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    handler = make_handler(args.fragments, args.fragment_kb * 1024, args.file_mb * 1024 * 1024,
+                           args.per_connection_kbps * 1024)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    tuning = DownloadTuning(fragment_concurrency=args.concurrency, connections=args.concurrency,
+                            chunk_size=1024 * 1024)
+    if not shutil.which("aria2c"):
+        print("aria2c not found: progressive downloads fall back to sequential ranges\n")
+
+    cases = [("HLS fragments", f"{base_url}/stream.m3u8"), ("Progressive file", f"{base_url}/video.mp4")]
+    for name, url in cases:
+        default_time, size = timed_download(url, {})
+        fast_time, fast_size = timed_download(url, tuning.ydl_opts())
+        mb = size / (1024 * 1024)
+        print(f"{name} ({mb:.1f} MB)")
+        print(f"    default          {default_time:6.2f} s  {mb / default_time:6.2f} MB/s")
+        print(f"    high throughput  {fast_time:6.2f} s  {fast_size / (1024 * 1024) / fast_time:6.2f} MB/s"
+              f"  ({default_time / fast_time:.1f}x)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
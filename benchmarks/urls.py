@@ -0,0 +1,88 @@
+"""
+URL parsing benchmark for bulk ingest. Builds a synthetic mix of share
+links (tracking params, short links, mobile hosts, lookalike and unsupported
+domains) and times utils.urls.parse_url against the old substring check.
+
+    python benchmarks/urls.py
+    python benchmarks/urls.py --count 5000000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.urls import parse_url
+
+OLD_DOMAINS = ["youtube.com", "youtu.be", "tiktok.com", "instagram.com", "twitter.com", "x.com",
+               "reddit.com", "linkedin.com", "facebook.com", "fb.watch"]
+
+
+def old_validate_url(url):
+    url_lower = url.lower()
+    return any(domain in url_lower for domain in OLD_DOMAINS)
+
+
+def make_urls(count, seed):
+    rng = random.Random(seed)
+
+    def yt_id():
+        return "".join(rng.choice(string.ascii_letters + string.digits + "-_") for _ in range(11))
+
+    def num_id():
+        return str(rng.randrange(10 ** 17, 10 ** 19))
+
+    shapes = [
+        lambda: f"https://www.youtube.com/watch?v={yt_id()}",
+        lambda: f"https://youtu.be/{yt_id()}?si={yt_id()}",
+        lambda: f"https://m.youtube.com/shorts/{yt_id()}?feature=share",
+        lambda: f"https://music.youtube.com/watch?v={yt_id()}&list=RD{yt_id()}",
+        lambda: f"https://x.com/someone/status/{num_id()}?s=20",
+        lambda: f"https://twitter.com/someone/status/{num_id()}",
+        lambda: f"https://www.tiktok.com/@user/video/{num_id()}?is_from_webapp=1",
+        lambda: f"https://www.instagram.com/reel/{yt_id()}/?igsh={yt_id()}",
+        lambda: f"https://www.reddit.com/r/videos/comments/{yt_id()[:7].lower()}/some_title/",
+        lambda: f"https://www.facebook.com/watch?v={num_id()}",
+        lambda: f"youtube.com/watch?v={yt_id()}",
+        lambda: f"https://notyoutube.com.evil/watch?v={yt_id()}",
+        lambda: f"https://example.com/?next=youtube.com/{yt_id()}",
+        lambda: f"https://vimeo.com/{num_id()}",
+    ]
+    return [rng.choice(shapes)() for _ in range(count)]
+
+
+def timed(fn, urls):
+    start = time.perf_counter()
+    results = [fn(u) for u in urls]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    urls = make_urls(args.count, args.seed)
+
+    old_time, old_results = timed(old_validate_url, urls)
+    new_time, new_results = timed(parse_url, urls)
+
+    accepted_old = sum(old_results)
+    accepted_new = sum(1 for r in new_results if r is not None)
+    with_id = sum(1 for r in new_results if r is not None and r.video_id)
+    unique = len({r.canonical_url for r in new_results if r is not None})
+
+    print(f"{args.count} URLs")
+    print(f"    substring check  {old_time:6.2f} s  {args.count / old_time / 1e6:6.2f} M URLs/s  accepted {accepted_old}")
+    print(f"    parse_url        {new_time:6.2f} s  {args.count / new_time / 1e6:6.2f} M URLs/s  accepted {accepted_new}"
+          f"  (with video ID {with_id}, unique {unique})")
+    print(f"    false positives rejected: {accepted_old - accepted_new}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+DEFAULT_AUDIO_FORMAT = "mp3"
+DEFAULT_AUDIO_BITRATE = 192 # kbps
+AUDIO_BITRATES = (96, 128, 160, 192, 256, 320)
+
+# Output format -> source codecs that can be stream-copied into it, the
+# encoder used otherwise and the ffmpeg muxer
+AUDIO_TARGETS = {
+    "mp3": {"codecs": ("mp3",), "encoder": "libmp3lame", "muxer": "mp3"},
+    "m4a": {"codecs": ("mp4a", "aac"), "encoder": "aac", "muxer": "ipod"},
+    "opus": {"codecs": ("opus",), "encoder": "libopus", "muxer": "opus"},
+}
+
+# Protocols we can read as one plain byte stream. Fragmented ones (HLS, DASH
+# segments) go through yt-dlp's downloader and postprocessor instead.
+STREAMABLE_PROTOCOLS = ("http", "https")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def audio_profile(audio_format, bitrate):
+    """
+    Download index profile for an audio download, e.g. 'mp3-192'.
+    """
+    return f"{audio_format}-{bitrate}"
+
+
+def can_copy(acodec, audio_format):
+    """
+    True if a source with this audio codec fits the target format as is.
+    """
+    if not acodec or acodec == "none":
+        return False
+    return acodec.split(".")[0].lower() in AUDIO_TARGETS[audio_format]["codecs"]
+
+
+def can_stream(fmt):
+    """
+    True if the selected format can be piped straight into ffmpeg.
+    """
+    return bool(fmt.get("url")) and fmt.get("protocol", "https") in STREAMABLE_PROTOCOLS and bool(shutil.which("ffmpeg"))
+
+
+def ffmpeg_audio_cmd(input_path, output_path, audio_format, bitrate, copy):
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-nostats", "-loglevel", "error", "-i", input_path, "-vn"]
+    if copy:
+        cmd += ["-c:a", "copy"]
+    else:
+        cmd += ["-c:a", AUDIO_TARGETS[audio_format]["encoder"], "-b:a", f"{bitrate}k"]
+    cmd += ["-f", AUDIO_TARGETS[audio_format]["muxer"], output_path]
+    return cmd
+
+
+def run_ffmpeg(cmd, feed=False):
+    """
+    Runs an ffmpeg command with its console window hidden on Windows. Waits
+    for it and raises subprocess.CalledProcessError (stderr attached) if it
+    fails; with feed=True returns the running Popen instead, with stdin
+    open for the caller to write into.
+    """
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+    if feed:
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, startupinfo=startupinfo)
+    return subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo)
+
+
+class RangedStream:
+    """
+    File-like reader over a format's URL. When its downloader_options set an
+    http_chunk_size (YouTube sets 10 MB: it throttles or cuts off unranged
+    requests), the bytes are fetched in Range requests of that size, the way
+    yt-dlp's own HTTP downloader does; otherwise in one request. size is the
+    exact length once a response tells it. A transfer that ends short of it
+    raises instead of passing a truncated file on.
+    """
+    def __init__(self, ydl, fmt):
+        self.ydl = ydl
+        self.url = fmt["url"]
+        self.headers = fmt.get("http_headers") or {}
+        self.chunk_size = (fmt.get("downloader_options") or {}).get("http_chunk_size")
+        self.size = None
+        self.position = 0
+        self.response = None
+        self._end = None # Exclusive end of the range being read
+        self._open()
+
+    def _open(self):
+        """
+        Requests the next range (or the whole file). False if the server says
+        there is nothing past the current position.
+        """
+        from yt_dlp.networking import Request
+        from yt_dlp.networking.exceptions import HTTPError
+
+        headers = dict(self.headers)
+        if self.chunk_size:
+            self._end = self.position + self.chunk_size
+            headers["Range"] = f"bytes={self.position}-{self._end - 1}"
+        try:
+            self.response = self.ydl.urlopen(Request(self.url, headers=headers))
+        except HTTPError as e:
+            if e.status == 416 and self.position:
+                return False # Range Not Satisfiable: the previous range ended the file
+            raise
+
+        if self.chunk_size and self.response.status != 206:
+            self.chunk_size = None # Server ignored Range and sent the whole file
+        content_range = self.response.headers.get("Content-Range") or ""
+        if content_range.rpartition("/")[2].isdigit():
+            self.size = int(content_range.rpartition("/")[2]) # bytes 0-10485759/54321000
+        elif not self.chunk_size and self.response.headers.get("Content-Length", "").isdigit():
+            self.size = self.position + int(self.response.headers["Content-Length"])
+        return True
+
+    def read(self, n):
+        chunk = self.response.read(n)
+        while not chunk:
+            self.response.close()
+            if self.size is not None and self.position >= self.size:
+                return b""
+            if not self.chunk_size:
+                if self.size is not None:
+                    raise Exception(f"Audio stream ended after {self.position} of {self.size} bytes.")
+                return b""
+            if self.size is None and self.position < self._end:
+                return b"" # Short range of unknown total: the end
+            if not self._open():
+                return b""
+            chunk = self.response.read(n)
+            if not chunk and self.size is not None and self.position < self.size:
+                raise Exception(f"Audio stream ended after {self.position} of {self.size} bytes.")
+        self.position += len(chunk)
+        return chunk
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+
+
+def stream_audio(ydl, fmt, output_path, audio_format=DEFAULT_AUDIO_FORMAT, bitrate=DEFAULT_AUDIO_BITRATE, progress_callback=None):
+    """
+    Reads the selected audio format over HTTP and pipes it into ffmpeg while
+    it downloads, so the transfer and the encode overlap and the source file
+    never lands on disk. Sources whose codec already fits audio_format are
+    stream-copied instead of re-encoded.
+
+    Honors ydl.params['ratelimit'] between chunks, so BandwidthScheduler can
+    throttle it like any other download, and reads in ranges where the
+    format asks for it (see RangedStream).
+    """
+    copy = can_copy(fmt.get("acodec"), audio_format)
+    logger.info(f"Streaming audio {fmt.get('format_id')} into {audio_format}"
+                f" ({'stream copy' if copy else f'{bitrate} kbps'})")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    part_path = output_path + ".part"
+    cmd = ffmpeg_audio_cmd("pipe:0", part_path, audio_format, bitrate, copy)
+
+    process = run_ffmpeg(cmd, feed=True)
+    # Drain stderr so ffmpeg can never block on a full pipe while we feed it
+    errors = []
+    drain = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    drain.start()
+
+    downloaded = 0
+    stream = None
+    try:
+        stream = RangedStream(ydl, fmt)
+        total = stream.size or fmt.get("filesize") or fmt.get("filesize_approx") or 0
+
+        window_start, window_bytes, window_rate = time.monotonic(), 0, None
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            try:
+                process.stdin.write(chunk)
+            except BrokenPipeError:
+                break # ffmpeg gave up; its exit code says why
+            downloaded += len(chunk)
+            if progress_callback and total:
+                progress_callback(min(downloaded / total * 100, 99.9), downloaded, total)
+
+            rate = ydl.params.get("ratelimit")
+            if rate != window_rate:
+                # Limit changed (or was lifted): measure from here
+                window_start, window_bytes, window_rate = time.monotonic(), 0, rate
+            window_bytes += len(chunk)
+            if rate:
+                delay = window_bytes / rate - (time.monotonic() - window_start)
+                if delay > 0:
+                    time.sleep(delay)
+
+        stream.close()
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.wait()
+        drain.join()
+        if process.returncode != 0:
+            message = (errors[0] if errors else b"").decode("utf-8", "replace").strip()
+            logger.error(f"FFmpeg audio conversion failed: {message}")
+            raise Exception("Failed to convert audio (FFmpeg error).")
+    except BaseException:
+        if stream is not None:
+            stream.close()
+        process.kill()
+        process.wait()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    os.replace(part_path, output_path)
+    if progress_callback:
+        progress_callback(100, downloaded, downloaded)
+    return output_path
+
+
+def extract_audio(source_path, output_path, acodec=None, audio_format=DEFAULT_AUDIO_FORMAT, bitrate=DEFAULT_AUDIO_BITRATE):
+    """
+    Converts an already downloaded file to audio_format (stream copy when
+    acodec fits) and removes the source. Used for sources that can't be
+    streamed, and run on the postprocessing stage rather than the download one.
+    """
+    copy = can_copy(acodec, audio_format)
+    same_file = os.path.abspath(source_path) == os.path.abspath(output_path)
+    if copy and same_file:
+        return output_path # Already what was asked for
+
+    logger.info(f"Extracting audio into {audio_format} ({'stream copy' if copy else f'{bitrate} kbps'})")
+    if same_file:
+        # Re-encoding into the same extension: convert from a renamed source
+        renamed = source_path + ".src"
+        os.replace(source_path, renamed)
+        source_path = renamed
+
+    part_path = output_path + ".part"
+    cmd = ffmpeg_audio_cmd(source_path, part_path, audio_format, bitrate, copy)
+
+    try:
+        run_ffmpeg(cmd)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg audio conversion failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        # Keep the source so the user can convert it by hand
+        raise Exception("Failed to convert audio (FFmpeg error).")
+
+    os.replace(part_path, output_path)
+    os.remove(source_path)
+    return output_path
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+
+INTERACTIVE = "interactive" # Someone is waiting on this download right now
+BACKGROUND = "background" # Bulk/archive pulls that can wait
+
+PRIORITY_WEIGHTS = {
+    INTERACTIVE: 8,
+    BACKGROUND: 1,
+}
+
+# Seconds of progress that measured throughput is averaged over. yt-dlp's
+# rate limiting lets data through in bursts with sleeps in between, so the
+# rate between two progress ticks says little.
+THROUGHPUT_WINDOW = 3.0
+
+
+def parse_rate(text):
+    """
+    Parses '500K', '2.5M', '1G' or a plain number of bytes/sec.
+    """
+    if text is None:
+        return None
+    text = str(text).strip().upper()
+    if text.endswith("/S"):
+        text = text[:-2]
+    text = text.rstrip("B")
+    multipliers = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(float(text))
+
+
+class Allocation:
+    """
+    One job's share of the bandwidth. The handler attaches the params dict of
+    each YoutubeDL that is downloading and detaches it once it's done or idle;
+    yt-dlp reads params['ratelimit'] on every chunk, so changing it here
+    throttles a download that's already running.
+    """
+    def __init__(self, key, priority, weight):
+        self.key = key
+        self.priority = priority
+        self.weight = weight
+        self.rate = None # bytes/sec, None = unlimited
+        self._params = []
+        self._samples = deque() # (monotonic time, bytes downloaded), over THROUGHPUT_WINDOW
+        self._lock = threading.Lock()
+
+    def attach(self, params):
+        with self._lock:
+            self._params.append(params)
+            self._apply()
+
+    def detach(self, params):
+        with self._lock:
+            if any(p is params for p in self._params):
+                self._params = [p for p in self._params if p is not params]
+                self._apply()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+            self._apply()
+
+    def _apply(self):
+        # Tracks downloading at the same time (video + audio) split the share
+        per_stream = None if self.rate is None else max(int(self.rate / max(len(self._params), 1)), 1024)
+        for params in self._params:
+            params['ratelimit'] = per_stream
+
+    def observe(self, downloaded):
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples
+            if samples and downloaded < samples[-1][1]:
+                samples.clear() # Counter went back: a retry or the next track
+            samples.append((now, downloaded))
+            # Keep the last sample from before the window as its baseline
+            while len(samples) > 2 and samples[1][0] <= now - THROUGHPUT_WINDOW:
+                samples.popleft()
+
+    @property
+    def throughput(self):
+        """
+        Measured bytes/sec over about the last THROUGHPUT_WINDOW seconds, up
+        to now, so a stalled download reads as slowing down.
+        """
+        with self._lock:
+            if len(self._samples) < 2:
+                return 0.0
+            (start, start_bytes), (_, last_bytes) = self._samples[0], self._samples[-1]
+            elapsed = time.monotonic() - start
+            return (last_bytes - start_bytes) / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "priority": self.priority,
+            "weight": self.weight,
+            "limit": None if self.rate is None else int(self.rate),
+            "throughput": int(self.throughput),
+        }
+
+
+class BandwidthScheduler:
+    """
+    Splits a global rate cap between running jobs by weight, where the weight
+    is the job's own weight times its priority class weight. Shares are
+    recomputed whenever a job starts or finishes.
+
+    Without a global cap nothing is limited, except that background jobs are
+    held to background_rate while any interactive job is running, so an
+    archive pull can't starve the download someone just clicked.
+    """
+    def __init__(self, global_limit=None, background_rate=512 * 1024):
+        self.global_limit = global_limit
+        self.background_rate = background_rate
+        self._allocations = {}
+        self._lock = threading.Lock()
+
+    def register(self, key, priority=INTERACTIVE, weight=1):
+        allocation = Allocation(key, priority, weight)
+        with self._lock:
+            self._allocations[key] = allocation
+            self._rebalance()
+        return allocation
+
+    def unregister(self, key):
+        with self._lock:
+            self._allocations.pop(key, None)
+            self._rebalance()
+
+    def set_global_limit(self, global_limit):
+        with self._lock:
+            self.global_limit = global_limit
+            self._rebalance()
+
+    def _rebalance(self):
+        allocations = list(self._allocations.values())
+        if not allocations:
+            return
+
+        if self.global_limit is None:
+            busy = any(a.priority == INTERACTIVE for a in allocations)
+            for a in allocations:
+                a.set_rate(self.background_rate if busy and a.priority == BACKGROUND else None)
+            return
+
+        total_weight = sum(PRIORITY_WEIGHTS[a.priority] * a.weight for a in allocations)
+        for a in allocations:
+            a.set_rate(self.global_limit * PRIORITY_WEIGHTS[a.priority] * a.weight / total_weight)
+
+    def allocation(self, key):
+        """
+        The running job's Allocation, or None if it isn't downloading.
+        """
+        with self._lock:
+            return self._allocations.get(key)
+
+    def stats(self):
+        """
+        Live view of every running job: priority, current cap and measured speed.
+        """
+        with self._lock:
+            return [{"job": a.key, **a.to_dict()} for a in self._allocations.values()]
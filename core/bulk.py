@@ -0,0 +1,99 @@
+import csv
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import setup_logger
+from utils.urls import parse_url, platform_of
+from utils.validators import validate_url
+
+logger = setup_logger()
+
+
+def parse_url_list(text):
+    """
+    Pulls supported URLs out of pasted text or CSV content. Every supported URL
+    is kept in canonical form; links that canonicalize to the same video
+    (different share params, youtu.be vs youtube.com) are dropped, order is kept.
+    """
+    urls = []
+    seen = set()
+    for row in csv.reader(io.StringIO(text)):
+        for cell in row:
+            for token in cell.split():
+                parsed = parse_url(token)
+                if parsed is not None and parsed.canonical_url not in seen:
+                    seen.add(parsed.canonical_url)
+                    urls.append(parsed.canonical_url)
+    return urls
+
+
+def load_url_file(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return parse_url_list(f.read())
+
+
+class DomainRateLimiter:
+    """
+    Spaces out requests to the same platform by at least `interval` seconds.
+    Requests to different platforms never wait on each other.
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self._next_slot = {} # platform -> earliest time the next request may start
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        platform = platform_of(url)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(platform, now))
+            self._next_slot[platform] = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BulkResolver:
+    """
+    Resolves metadata for many URLs in parallel. on_result(url, video_info, info, error)
+    is called from a worker thread as soon as each URL finishes, so callers
+    can show results while the rest are still resolving.
+    """
+    def __init__(self, handler, max_workers=8, per_domain_interval=0.5):
+        self.handler = handler
+        self.max_workers = max_workers
+        self.limiter = DomainRateLimiter(per_domain_interval)
+
+    def resolve_all(self, urls, on_result, on_done=None):
+        """
+        Starts resolving in the background and returns immediately.
+        """
+        urls = [u for u in urls if validate_url(u)]
+        logger.info(f"Bulk resolving {len(urls)} URLs with {self.max_workers} workers.")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bulk-resolve")
+        futures = [executor.submit(self._resolve_one, url, on_result) for url in urls]
+
+        def wait_all():
+            for future in futures:
+                future.result()
+            executor.shutdown()
+            logger.info("Bulk resolve finished.")
+            if on_done:
+                on_done()
+
+        threading.Thread(target=wait_all, daemon=True).start()
+
+    def _resolve_one(self, url, on_result):
+        self.limiter.wait(url)
+        try:
+            video_info, info = self.handler.resolve(url)
+            error = None
+        except Exception as e:
+            video_info, info, error = None, None, str(e)
+
+        try:
+            on_result(url, video_info, info, error)
+        except Exception as e:
+            logger.error(f"Bulk result callback failed: {e}")
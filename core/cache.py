@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from utils.logger import setup_logger
+from utils.urls import canonical_key
+
+logger = setup_logger()
+
+
+def cache_key(url):
+    """
+    Builds a canonical key for a URL so that share links with different
+    tracking params (?si=..., ?s=20) map to the same cache entry.
+    """
+    return canonical_key(url)
+
+
+class MetadataCache:
+    """
+    On-disk cache of fetched metadata. Entries are zlib-compressed JSON rows in
+    a single SQLite file, each with its own expiry. When the cache grows past
+    max_entries the least recently used rows are evicted.
+    """
+    def __init__(self, path=os.path.join("cache", "metadata.db"), ttl=24 * 60 * 60, max_entries=500):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " key TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        key = cache_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM metadata WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE metadata SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url, data, ttl=None):
+        key = cache_key(url)
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        blob = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata (key, data, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, expires_at, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM metadata WHERE expires_at < ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM metadata WHERE key IN "
+                "(SELECT key FROM metadata ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+            logger.info(f"Metadata cache evicted {overflow} entries.")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM metadata")
+            self._conn.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
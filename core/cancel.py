@@ -0,0 +1,56 @@
+import glob
+import os
+import threading
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class DownloadCancelled(Exception):
+    """
+    Raised out of download_stream when its CancelToken was set.
+    """
+    def __init__(self):
+        super().__init__("Download cancelled")
+
+
+class CancelToken:
+    """
+    Stops a running download from another thread. The download checks the
+    token on every progress update, so it stops within a chunk or fragment;
+    a metadata extraction or ffmpeg merge already running is let finish.
+
+    cancel(discard=False) stops without removing partial files, so the job
+    can be resumed later (used when the app closes).
+    """
+    def __init__(self):
+        self.discard = True
+        self._event = threading.Event()
+
+    def cancel(self, discard=True):
+        self.discard = discard
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise DownloadCancelled()
+
+
+def remove_partial_files(paths):
+    """
+    Removes the files a cancelled download left behind: the given paths plus
+    the .part, .ytdl and fragment files yt-dlp keeps next to them.
+    """
+    for path in paths:
+        candidates = [path, path + ".part", path + ".ytdl"] + glob.glob(glob.escape(path) + "*-Frag*")
+        for candidate in candidates:
+            try:
+                if os.path.isfile(candidate):
+                    os.remove(candidate)
+                    logger.info(f"Removed partial file {candidate}")
+            except OSError as e:
+                logger.warning(f"Could not remove partial file {candidate}: {e}")
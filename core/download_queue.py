@@ -0,0 +1,348 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from core.audio import DEFAULT_AUDIO_FORMAT, DEFAULT_AUDIO_BITRATE
+from core.bandwidth import INTERACTIVE, BACKGROUND
+from core.cancel import CancelToken, DownloadCancelled, remove_partial_files
+from core.policy import FormatPolicy
+from core.postprocess import StageStats
+from core.progress import ProgressAggregator
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+QUEUED = "queued"
+ACTIVE = "active"
+POSTPROCESSING = "postprocessing" # Downloaded, waiting on/being merged or transcoded
+FINISHED = "finished"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class DownloadJob:
+    """
+    State of a single queued download. Everything download_stream needs is
+    held here so jobs never share mutable state on the handler.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, url, format_id, download_path, is_audio=False, info=None, title=None, group="default", high_throughput=False, resume=False, priority=INTERACTIVE, weight=1, audio_format=DEFAULT_AUDIO_FORMAT, audio_bitrate=DEFAULT_AUDIO_BITRATE, policy=None):
+        self.id = next(self._ids)
+        self.url = url
+        self.format_id = format_id
+        self.policy = policy # Optional FormatPolicy; picks format_id/is_audio when the job runs
+        self.download_path = download_path
+        self.is_audio = is_audio
+        self.audio_format = audio_format
+        self.audio_bitrate = audio_bitrate # kbps
+        self.info = info # Raw yt-dlp info dict, reused to skip re-extraction
+        self.title = title or url
+        self.group = group # Jobs are scheduled round-robin across groups
+        self.high_throughput = high_throughput
+        self.resume = resume # Continue from leftover .part files of an interrupted run
+        self.priority = priority # INTERACTIVE jobs start first and get the larger bandwidth share
+        self.weight = weight
+        self.journal_id = None
+        self.on_done = None # Optional callback, called with the job once it has finished, failed or been cancelled
+        self.cancel_token = CancelToken()
+        self.attempts = 0 # Failed runs so far, across restarts
+        self.partials = set() # Files yt-dlp has written for this job, across restarts
+
+        self.state = QUEUED
+        self.progress = 0.0
+        self.downloaded = 0
+        self.total = 0
+        self.filename = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+
+class DownloadQueue:
+    """
+    Runs queued downloads on a fixed pool of worker threads.
+
+    Jobs are kept in one FIFO per (priority, group). Workers always take
+    interactive jobs before background ones, and within a priority take from
+    the groups in turn, so a large batch can't starve a single download
+    added after it.
+    """
+    def __init__(self, handler, max_workers=3, on_update=None, progress=None, journal=None, bandwidth=None, postprocessor=None, tracer=None, keep_finished=None):
+        self.handler = handler
+        self.max_workers = max_workers
+        self.on_update = on_update # Called with a job whenever its state changes
+        # Progress ticks go here, keyed by job id, instead of to on_update
+        self.progress = progress if progress is not None else ProgressAggregator()
+        self.journal = journal # Optional JobJournal; jobs are recorded so they survive restarts
+        self.bandwidth = bandwidth # Optional BandwidthScheduler shared by all running jobs
+        # Optional PostprocessPool. With one, workers hand merges/transcodes over
+        # and pick up the next download instead of waiting for ffmpeg.
+        self.postprocessor = postprocessor
+        self.tracer = tracer # Optional metrics Tracer; each job gets spans per phase
+        # Finished, failed and cancelled jobs kept in self.jobs, oldest dropped
+        # first; None keeps them all (fine for one run, not for a long-lived service)
+        self.keep_finished = keep_finished
+        self.stage = StageStats("network", max_workers)
+
+        self.jobs = OrderedDict() # id -> DownloadJob, in submission order
+        self._completed = deque() # ids of completed jobs still in self.jobs, in completion order
+        self._groups = OrderedDict() # (priority, group) -> deque of pending jobs
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._interrupted = False # Set by shutdown(interrupt=True): workers take no new jobs
+        self._workers = []
+
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job):
+        with self._cond:
+            self.jobs[job.id] = job
+            self._groups.setdefault((job.priority, job.group), deque()).append(job)
+            self._cond.notify()
+        logger.info(f"Queued job {job.id}: {job.title} ({job.format_id})")
+        self._notify(job)
+        return job
+
+    def restore(self):
+        """
+        Re-queues jobs the journal recorded as unfinished. Returns the new jobs.
+        """
+        if self.journal is None:
+            return []
+
+        jobs = []
+        for row in self.journal.unfinished():
+            job = DownloadJob(
+                row['url'],
+                row['format_id'],
+                row['download_path'],
+                is_audio=bool(row['is_audio']),
+                audio_format=row['audio_format'],
+                audio_bitrate=row['audio_bitrate'],
+                policy=FormatPolicy(row['policy']) if row['policy'] else None,
+                title=row['title'],
+                group=row['group'],
+                high_throughput=bool(row['high_throughput']),
+                resume=True,
+                priority=row['priority'],
+                weight=row['weight'],
+            )
+            job.journal_id = row['id']
+            job.attempts = row['attempts']
+            job.partials = set(row['partials'])
+            job.downloaded = row['downloaded']
+            job.total = row['total']
+            logger.info(f"Resuming job {job.title} from {row['downloaded']} bytes")
+            jobs.append(self.submit(job))
+        return jobs
+
+    def _next_job(self):
+        # Round-robin: take the head of the first non-empty group, then move that
+        # group to the back so the other groups get the next turn.
+        for priority in (INTERACTIVE, BACKGROUND):
+            for key, pending in self._groups.items():
+                if key[0] == priority and pending:
+                    job = pending.popleft()
+                    self._groups.move_to_end(key)
+                    return job
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = None if self._interrupted else self._next_job()
+                while job is None and not self._stopped:
+                    self._cond.wait()
+                    job = None if self._interrupted else self._next_job()
+                if job is None:
+                    return
+                job.state = ACTIVE
+                job.started_at = time.time()
+            self._notify(job)
+            self._run(job)
+
+    def _run(self, job):
+        def on_progress(percentage, downloaded, total):
+            job.progress = percentage
+            job.downloaded = downloaded
+            job.total = total
+            self.progress.update(job.id, downloaded, total)
+            if allocation:
+                allocation.observe(downloaded)
+            if self.journal:
+                self.journal.record_progress(job)
+
+        allocation = None
+        if self.bandwidth:
+            allocation = self.bandwidth.register(job.id, job.priority, job.weight)
+
+        trace = None
+        if self.tracer:
+            trace = self.tracer.job(job.id)
+            trace.record("queued", job.created_at, job.started_at - job.created_at, group=job.group)
+
+        self.stage.begin()
+        try:
+            result = self.handler.download_stream(
+                job.format_id,
+                job.download_path,
+                on_progress,
+                None,
+                is_audio=job.is_audio,
+                url=job.url,
+                info=job.info,
+                high_throughput=job.high_throughput,
+                resume=job.resume,
+                bandwidth=allocation,
+                audio_format=job.audio_format,
+                audio_bitrate=job.audio_bitrate,
+                postprocessor=self.postprocessor,
+                trace=trace,
+                policy=job.policy,
+                cancel=job.cancel_token,
+                partials=job.partials,
+            )
+        except Exception as e:
+            self.stage.end(ok=False)
+            self._complete(job, error=e)
+            return
+        finally:
+            if allocation:
+                self.bandwidth.unregister(job.id)
+        self.stage.end()
+
+        if isinstance(result, Future):
+            job.state = POSTPROCESSING
+            self._notify(job)
+
+            def on_done(future):
+                if future.cancelled():
+                    # Dropped by an interrupting shutdown before ffmpeg ran; stays journaled
+                    self._complete(job, error=DownloadCancelled())
+                    return
+                error = future.exception()
+                self._complete(job, None if error else future.result(), error)
+            result.add_done_callback(on_done)
+        else:
+            self._complete(job, result)
+
+    def cancel(self, job, discard=True):
+        """
+        Cancels a job. A queued job is dropped right away; a running one stops
+        at its next progress update and removes its partial files. With
+        discard=False the files and the journal entry are kept, so the job
+        is resumed on the next start.
+        """
+        with self._cond:
+            pending = self._groups.get((job.priority, job.group))
+            queued = job.state == QUEUED and pending is not None and job in pending
+            if queued:
+                pending.remove(job)
+        job.cancel_token.cancel(discard)
+        if queued:
+            self._complete(job, error=DownloadCancelled())
+
+    def _complete(self, job, filename=None, error=None):
+        if isinstance(error, DownloadCancelled):
+            job.state = CANCELLED
+        elif error is None:
+            job.filename = filename
+            job.state = FINISHED
+            job.progress = 100.0
+        else:
+            job.error = str(error)
+            job.state = FAILED
+            job.attempts += 1
+            if self.journal and job.attempts >= self.journal.max_attempts:
+                # The journal drops it now; nothing will resume from these
+                logger.warning(f"Giving up on job {job.title} after {job.attempts} attempts")
+                remove_partial_files(job.partials)
+        job.info = None # Don't hold large info dicts for finished jobs
+        job.finished_at = time.time()
+        with self._cond:
+            if self.keep_finished is not None:
+                self._completed.append(job.id)
+                while len(self._completed) > self.keep_finished:
+                    self.jobs.pop(self._completed.popleft(), None)
+            self._cond.notify_all() # Wake up join()
+        self.progress.remove(job.id)
+        # An interrupted job stays in the journal as it was, to be resumed
+        self._notify(job, journal=job.state != CANCELLED or job.cancel_token.discard)
+        if job.on_done:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                logger.error(f"Job completion callback failed: {e}")
+
+    def _notify(self, job, journal=True):
+        if journal and self.journal:
+            try:
+                self.journal.record(job)
+            except Exception as e:
+                logger.error(f"Failed to journal job {job.id}: {e}")
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                logger.error(f"Queue update callback failed: {e}")
+
+    def stats(self):
+        """
+        Utilization of the download workers and, if there is one, the
+        postprocessing pool. See StageStats.
+        """
+        with self._cond:
+            pending = sum(len(q) for q in self._groups.values())
+        stages = [self.stage.to_dict(queued=pending)]
+        if self.postprocessor is not None:
+            stages.append(self.postprocessor.stats())
+        return stages
+
+    def snapshot(self):
+        with self._cond:
+            return list(self.jobs.values())
+
+    def join(self, timeout=None):
+        """
+        Blocks until every submitted job has finished or failed.
+        Returns False if the timeout ran out first.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while any(j.state in (QUEUED, ACTIVE, POSTPROCESSING) for j in self.jobs.values()):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, interrupt=False, timeout=None):
+        """
+        Stops the workers once the queue is empty. With interrupt=True they
+        take no further jobs, running downloads are stopped with their
+        partial files kept (see cancel), and this waits up to timeout
+        seconds for the workers to exit; merges that haven't started are
+        dropped. Everything unfinished stays in the journal for the next start.
+        """
+        with self._cond:
+            self._stopped = True
+            self._interrupted = interrupt
+            running = [j for j in self.jobs.values() if j.state in (ACTIVE, POSTPROCESSING)]
+            self._cond.notify_all()
+        if interrupt:
+            for job in running:
+                job.cancel_token.cancel(discard=False)
+            if self.postprocessor is not None:
+                # First, so no worker stays blocked handing a merge to a full pool
+                self.postprocessor.shutdown(wait=False, cancel_futures=True)
+            deadline = None if timeout is None else time.time() + timeout
+            for worker in self._workers:
+                worker.join(None if deadline is None else max(deadline - time.time(), 0))
+        elif self.postprocessor is not None:
+            self.postprocessor.shutdown(wait=False)
@@ -1,135 +1,502 @@
+import itertools
 import os
 import re
-import yt_dlp
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from core.audio import DEFAULT_AUDIO_FORMAT, DEFAULT_AUDIO_BITRATE, audio_profile, can_stream, extract_audio, run_ffmpeg, stream_audio
+from core.cache import MetadataCache
+from core.cancel import DownloadCancelled, remove_partial_files
+from core.formats import FormatTable, Stream, video_score
+from core.library import DownloadIndex
+from core.metrics import NULL_TRACE, RetryCounter
+from core.playlist import IsPlaylist, PlaylistEntry
+from core.tuning import DownloadTuning
 from utils.logger import setup_logger
+from utils.urls import canonical_url, parse_url
 
 logger = setup_logger()
 
+# Signed format URLs (e.g. YouTube's googlevideo links) stop working after a while.
+# If an info dict is older than this, or any format URL is past its `expire` param,
+# we re-extract instead of reusing it.
+INFO_MAX_AGE = 60 * 60  # seconds
+INFO_EXPIRY_MARGIN = 5 * 60  # seconds of headroom before a signed URL expires
+
+# yt-dlp loads hundreds of extractors on import, which takes longer than
+# bringing up the window. It's imported on first use (or by warm_up()).
+_yt_dlp = None
+_yt_dlp_lock = threading.Lock()
+
+def load_yt_dlp():
+    global _yt_dlp
+    with _yt_dlp_lock:
+        if _yt_dlp is None:
+            import yt_dlp
+            _yt_dlp = yt_dlp
+    return _yt_dlp
+
+def warm_up():
+    """
+    Imports yt-dlp on a background thread so the first fetch doesn't pay for it.
+    """
+    threading.Thread(target=load_yt_dlp, name="yt-dlp-warmup", daemon=True).start()
+
+def merge_tracks(video_path, audio_path, output_path):
+    """
+    Muxes a video and an audio track into output_path with ffmpeg (no re-encode).
+    """
+    logger.info("Merging Video and Audio...")
+
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", video_path,
+        "-i", audio_path,
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-c", "copy",
+        output_path
+    ]
+
+    try:
+        run_ffmpeg(cmd)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg merge failed: {e}")
+        # Don't delete temps so user can manually recover
+        raise Exception("Failed to merge video and audio (FFmpeg error).")
+
+    logger.info("Merge successful.")
+    os.remove(video_path)
+    os.remove(audio_path)
+    return output_path
+
 class VideoInfo:
+    # Bumped when the shape of the stream dicts changes, so older cache entries are refetched
+    VERSION = 2
+    __slots__ = ("title", "thumbnail_url", "length", "author", "streams_mp4", "streams_mp3")
+
     def __init__(self, title, thumbnail_url, length, author, streams_mp4, streams_mp3):
         self.title = title
         self.thumbnail_url = thumbnail_url
         self.length = length
         self.author = author
-        self.streams_mp4 = streams_mp4 # List of dicts
-        self.streams_mp3 = streams_mp3 # List of dicts
+        self.streams_mp4 = streams_mp4 # List of Streams, ascending quality
+        self.streams_mp3 = streams_mp3 # List of Streams, ascending quality
+
+    def to_dict(self):
+        return {
+            "version": self.VERSION,
+            "title": self.title,
+            "thumbnail_url": self.thumbnail_url,
+            "length": self.length,
+            "author": self.author,
+            "streams_mp4": [s.to_dict() for s in self.streams_mp4],
+            "streams_mp3": [s.to_dict() for s in self.streams_mp3],
+        }
+
+    def describe(self):
+        """
+        Public view of the metadata and formats, as the CLI prints it and the
+        HTTP service returns it. See Stream.describe.
+        """
+        return {
+            "title": self.title,
+            "author": self.author,
+            "length": self.length,
+            "thumbnail_url": self.thumbnail_url,
+            "video": [s.describe() for s in self.streams_mp4],
+            "audio": [s.describe() for s in self.streams_mp3],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["title"],
+            data["thumbnail_url"],
+            data["length"],
+            data["author"],
+            [Stream.from_dict(s) for s in data["streams_mp4"]],
+            [Stream.from_dict(s) for s in data["streams_mp3"]],
+        )
 
 class DownloaderHandler:
-    def __init__(self):
-        self.on_progress_callback = None
-        self.on_complete_callback = None
+    def __init__(self, cache=None, tuning=None, library=None, format_score=video_score):
+        # Only the result of the last fetch lives on the handler. Everything a
+        # download needs is passed per call, so one handler can serve several
+        # concurrent downloads.
         self.url = None # Cached URL
+        self.info = None # Raw yt-dlp info dict from the last fetch
+        self.cache = cache if cache is not None else MetadataCache()
+        self.tuning = tuning if tuning is not None else DownloadTuning() # Used when high_throughput=True
+        self.library = library if library is not None else DownloadIndex() # Completed downloads, for dedup
+        self.format_score = format_score # Score column (see core.formats) picking the video format listed per resolution
 
     def fetch_metadata(self, url):
-        logger.info(f"Fetching metadata for URL: {url}")
+        url = canonical_url(url)
+        video_info, info = self.resolve(url)
         self.url = url
-        
+        self.info = info
+        return video_info
+
+    def resolve(self, url, trace=None):
+        """
+        Fetches metadata without touching the handler's state, so it is safe to
+        call from several threads at once. Returns (VideoInfo, raw info dict);
+        the info dict is None on a cache hit. trace is an optional JobTrace.
+        """
+        trace = trace or NULL_TRACE
+        # Tracking params and alternate URL shapes only get in the way of the extractor
+        url = canonical_url(url)
+        logger.info(f"Fetching metadata for URL: {url}")
+
+        cached = self.cache.get(url)
+        if cached is not None and cached.get("version") == VideoInfo.VERSION:
+            # No raw info dict on a cache hit; download_stream will extract once.
+            logger.info("Metadata served from cache.")
+            return VideoInfo.from_dict(cached), None
+
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': False,
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
         }
 
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+            with load_yt_dlp().YoutubeDL(ydl_opts) as ydl, trace.span("extract"):
+                # Look before processing: a playlist would otherwise be walked
+                # page by page before we could tell it apart from a video
+                info = ydl.extract_info(url, download=False, process=False)
+                if info.get('_type') in ('playlist', 'multi_video'):
+                    raise IsPlaylist(url, info.get('title'))
+                info = ydl.process_ie_result(info, download=False)
 
             title = info.get('title', 'Unknown Title')
             thumbnail = info.get('thumbnail', '')
             length = info.get('duration', 0)
             author = info.get('uploader', 'Unknown Author')
-            
-            formats = info.get('formats', [])
-            
-            mp4_options = []
-            mp3_options = []
-            seen_res = set()
-
-            for f in formats:
-                format_id = f.get('format_id')
-                filesize = f.get('filesize') or f.get('filesize_approx')
-                
-                if filesize:
-                    filesize_mb = filesize / (1024 * 1024)
-                    filesize_str = f"{filesize_mb:.1f} MB"
-                else:
-                    filesize_str = "Unknown Size"
-
-                # Audio Options: vcodec='none' means audio only
-                if f.get('vcodec') == 'none' and f.get('acodec') != 'none':
-                    abr = f.get('abr')
-                    if abr:
-                        mp3_options.append({
-                            "resolution": f"{int(abr)}kbps",
-                            "filesize": filesize_str,
-                            "itag": format_id,
-                            "type": "audio",
-                        })
-
-                # Video Options: vcodec!='none'
-                elif f.get('vcodec') != 'none':
-                    height = f.get('height')
-                    if not height: continue
-                    
-                    res_str = f"{height}p"
-                    
-                    # Deduplicate by resolution (prefering better container/bitrate implicitly by order)
-                    if res_str not in seen_res:
-                        mp4_options.append({
-                            "resolution": res_str,
-                            "filesize": filesize_str,
-                            "itag": format_id,
-                            "type": "video",
-                        })
-                        seen_res.add(res_str)
-
-            # Sort MP4 by resolution descending
-            def res_sort_key(item):
-                r = item['resolution'].replace('p', '')
-                return int(r) if r.isdigit() else 0
-            
-            mp4_options.sort(key=res_sort_key, reverse=False)
-            
-            # Sort MP3 by bitrate descending
-            def audio_sort_key(item):
-                r = item['resolution'].replace('kbps', '')
-                return int(r) if r.isdigit() else 0
-            mp3_options.sort(key=audio_sort_key, reverse=False)
+
+            table = FormatTable(info.get('formats') or [])
+            mp4_options = table.video_streams(self.format_score)
+            mp3_options = table.audio_streams()
+
+            video_info = VideoInfo(title, thumbnail, length, author, mp4_options, mp3_options)
+            self.cache.put(url, video_info.to_dict())
 
             logger.info("Metadata fetched successfully.")
-            return VideoInfo(title, thumbnail, length, author, mp4_options, mp3_options)
+            return video_info, info
 
+        except IsPlaylist:
+            raise
         except Exception as e:
             logger.error(f"Error fetching metadata: {str(e)}")
             raise Exception(f"Failed to fetch video info: {str(e)}")
 
-    def _progress_hook(self, d):
+    def iter_entries(self, url, max_depth=2, skip=None):
+        """
+        Lists the videos of a playlist or channel as PlaylistEntry objects.
+        Flat and lazy: pages are requested only as the generator is consumed,
+        no video is extracted, and nothing is kept once yielded. Channels that
+        list tabs (Videos, Shorts, Live) are walked tab by tab. A plain video
+        URL yields a single entry.
+
+        skip is an optional set of entry sources (see PlaylistEntry.source)
+        the caller can add to while consuming: a listing whose source is in
+        it stops after the entry just yielded and the walk moves on to the
+        next tab or playlist.
+        """
+        url = canonical_url(url)
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+        }
+        index = 0
+        with load_yt_dlp().YoutubeDL(ydl_opts) as ydl:
+            for entry in self._walk_entries(ydl, url, max_depth, skip):
+                index += 1
+                entry.index = index
+                yield entry
+
+    def _walk_entries(self, ydl, url, depth, skip=None):
+        logger.info(f"Enumerating {url}")
+        info = ydl.extract_info(url, download=False, process=False)
+        if info.get('_type') not in ('playlist', 'multi_video'):
+            yield PlaylistEntry(info.get('id'), info.get('webpage_url') or url, info.get('title'), info.get('duration'), source=url)
+            return
+
+        for entry in self._iter_pages(info.get('entries')):
+            if not entry:
+                continue
+            entry_url = entry.get('url') or entry.get('webpage_url')
+            if entry.get('_type') == 'playlist' and depth > 0:
+                # Nested playlist given inline
+                yield from self._walk_nested(ydl, entry, url, skip)
+            elif entry_url and self._is_collection_entry(entry, entry_url) and depth > 0:
+                yield from self._walk_entries(ydl, entry_url, depth - 1, skip)
+            elif entry_url:
+                yield PlaylistEntry(entry.get('id'), entry_url, entry.get('title'), entry.get('duration'), source=url)
+                if skip and url in skip:
+                    logger.info(f"Stopped enumerating {url}")
+                    return
+
+    def _walk_nested(self, ydl, playlist, parent_url, skip=None):
+        source = playlist.get('webpage_url') or playlist.get('url') or parent_url
+        for entry in self._iter_pages(playlist.get('entries')):
+            entry_url = entry and (entry.get('url') or entry.get('webpage_url'))
+            if entry_url:
+                yield PlaylistEntry(entry.get('id'), entry_url, entry.get('title'), entry.get('duration'), source=source)
+                if skip and source in skip:
+                    return
+
+    @staticmethod
+    def _iter_pages(entries):
+        """
+        Iterates yt-dlp's entries, whatever form they come in (list, generator
+        or paged list). A paged list is read a page at a time and ends on a
+        short page or at its known page count, like its own getslice(), so
+        no request is made past the last page.
+        """
+        if entries is None:
+            return
+        PagedList = load_yt_dlp().utils.PagedList
+        if isinstance(entries, PagedList):
+            pagesize = getattr(entries, '_pagesize', None)
+            pagecount = getattr(entries, '_pagecount', float('inf')) # Known in advance for InAdvancePagedList
+            for pagenum in itertools.count():
+                if pagenum >= pagecount:
+                    return
+                page = entries.getpage(pagenum)
+                yield from page
+                if not page or (pagesize and len(page) < pagesize):
+                    return
+        else:
+            yield from entries
+
+    @staticmethod
+    def _is_collection_entry(entry, entry_url):
+        # Tabs and sub-playlists come back as url entries of a playlist extractor
+        ie_key = entry.get('ie_key') or ''
+        if ie_key.endswith(('Tab', 'Playlist', 'Channel')):
+            return True
+        parsed = parse_url(entry_url)
+        return parsed is not None and parsed.video_id is None and ie_key == ''
+
+
+    def apply_policy(self, url, info, policy, trace=NULL_TRACE):
+        """
+        Extracts url (unless info is still fresh) and picks its format with a
+        FormatPolicy. Returns (info, Choice).
+        """
+        if self._info_is_stale(info):
+            with load_yt_dlp().YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl, trace.span("extract"):
+                info = ydl.extract_info(url, download=False)
+        with trace.span("select", policy=str(policy)):
+            choice = policy.choose(info.get('formats') or [])
+        if choice is None:
+            raise Exception(f"No format matches the policy '{policy}'")
+        logger.info(f"Policy picked {'audio' if choice.is_audio else 'video'} format {choice.format_id}")
+        return info, choice
+
+    def _reuse(self, existing, download_path, progress_callback, complete_callback):
+        filename = self.library.materialize(existing, download_path)
+        logger.info(f"Already downloaded, reusing {existing}")
+        if progress_callback:
+            size = os.path.getsize(filename)
+            progress_callback(100, size, size)
+        if complete_callback:
+            complete_callback(filename)
+        return filename
+
+    @staticmethod
+    def _info_is_stale(info):
+        """
+        True if an info dict can no longer be trusted for downloading.
+        """
+        if not info:
+            return True
+
+        # yt-dlp stamps processed info dicts with the extraction time
+        now = time.time()
+        if now - info.get('epoch', 0) > INFO_MAX_AGE:
+            return True
+
+        for f in info.get('formats') or []:
+            url = f.get('url')
+            if not url:
+                continue
+            expire = parse_qs(urlparse(url).query).get('expire')
+            if expire and expire[0].isdigit() and int(expire[0]) - INFO_EXPIRY_MARGIN < now:
+                return True
+        return False
+
+    @staticmethod
+    def _progress_hook(d, progress_callback):
         if d['status'] == 'downloading':
             total = d.get('total_bytes') or d.get('total_bytes_estimate')
             downloaded = d.get('downloaded_bytes', 0)
             
             if total:
                 percentage = (downloaded / total) * 100
-                if self.on_progress_callback:
-                    self.on_progress_callback(percentage, downloaded, total)
+                if progress_callback:
+                    progress_callback(percentage, downloaded, total)
         
         elif d['status'] == 'finished':
-            if self.on_progress_callback:
-                self.on_progress_callback(100, 100, 100)
+            if progress_callback:
+                progress_callback(100, 100, 100)
+
+    @staticmethod
+    def _select_tracks(ydl, info):
+        """
+        Runs format selection without downloading. Returns the processed info
+        if it picked a separate video and audio track that we can fetch in
+        parallel and merge ourselves, otherwise None.
+        """
+        if not shutil.which("ffmpeg"):
+            return None
+        selected = ydl.process_ie_result(ydl.sanitize_info(info, remove_private_keys=True), download=False)
+        if len(selected.get('requested_formats') or []) != 2:
+            return None
+        return selected
 
-    def download_stream(self, format_id, download_path, progress_callback, complete_callback, is_audio=False):
+    @staticmethod
+    def _select_audio_stream(ydl, info):
+        """
+        Runs format selection without downloading. Returns the processed info
+        (with the chosen format's URL and headers) if that format can be piped
+        straight into ffmpeg, otherwise None.
+        """
+        selected = ydl.process_ie_result(ydl.sanitize_info(info, remove_private_keys=True), download=False)
+        if selected.get('requested_formats') or not can_stream(selected):
+            return None
+        return selected
+
+    def _download_tracks(self, ydl, ydl_opts, info, selected, progress_callback, bandwidth=None, trace=NULL_TRACE, watch=None):
+        """
+        Downloads the video and audio tracks at the same time. Returns their
+        paths and the name of the merged file; merging is left to the caller.
+        Progress is reported for both tracks combined.
+        """
+        filename = ydl.prepare_filename(selected)
+        base, _ = os.path.splitext(filename)
+        tracks = selected['requested_formats']
+
+        lock = threading.Lock()
+        downloaded = {t['format_id']: 0 for t in tracks}
+        totals = {t['format_id']: t.get('filesize') or t.get('filesize_approx') or 0 for t in tracks}
+
+        def report(format_id, d):
+            with lock:
+                if d['status'] == 'downloading':
+                    downloaded[format_id] = d.get('downloaded_bytes', 0)
+                    totals[format_id] = d.get('total_bytes') or d.get('total_bytes_estimate') or totals[format_id]
+                elif d['status'] == 'finished':
+                    downloaded[format_id] = totals[format_id] = d.get('total_bytes') or d.get('downloaded_bytes') or totals[format_id]
+                else:
+                    return
+                done, total = sum(downloaded.values()), sum(totals.values())
+            if total and progress_callback:
+                progress_callback(min(done / total * 100, 99.9), done, total)
+
+        def fetch(track):
+            format_id = track['format_id']
+            opts = dict(ydl_opts)
+            opts.pop('merge_output_format', None)
+            opts['format'] = format_id
+            # Same naming as yt-dlp uses for the parts of a merge
+            opts['outtmpl'] = base.replace('%', '%%') + f'.f{format_id}.%(ext)s'
+            opts['progress_hooks'] = [watch, lambda d: report(format_id, d)] if watch else [lambda d: report(format_id, d)]
+            with trace.span("download", track=format_id) as span:
+                opts['logger'] = RetryCounter(span)
+                with load_yt_dlp().YoutubeDL(opts) as track_ydl:
+                    if bandwidth:
+                        bandwidth.attach(track_ydl.params)
+                    try:
+                        result = track_ydl.process_ie_result(track_ydl.sanitize_info(info, remove_private_keys=True), download=True)
+                    finally:
+                        if bandwidth:
+                            # The other track gets the whole share once this one is done
+                            bandwidth.detach(track_ydl.params)
+                with lock:
+                    span.bytes = downloaded[format_id]
+            return result['requested_downloads'][0]['filepath']
+
+        logger.info(f"Downloading tracks in parallel: {', '.join(t['format_id'] for t in tracks)}")
+        with ThreadPoolExecutor(max_workers=len(tracks)) as executor:
+            video_path, audio_path = executor.map(fetch, tracks)
+        return video_path, audio_path, filename
+
+    def download_stream(self, format_id, download_path, progress_callback, complete_callback, is_audio=False, url=None, info=None, high_throughput=False, resume=False, bandwidth=None, audio_format=DEFAULT_AUDIO_FORMAT, audio_bitrate=DEFAULT_AUDIO_BITRATE, postprocessor=None, trace=None, policy=None, cancel=None, partials=None):
         """
         Downloads the specified stream using yt-dlp.
+        url/info default to the result of the last fetch_metadata call.
+        high_throughput fetches fragments/ranges over several connections (see DownloadTuning).
+        resume keeps files from an interrupted run instead of starting over.
+        bandwidth is an Allocation from BandwidthScheduler that caps this download's rate.
+        Audio is converted to audio_format ('mp3', 'm4a' or 'opus') at audio_bitrate kbps,
+        streamed through ffmpeg while it downloads when the source allows it.
+
+        With a PostprocessPool as postprocessor, merging/transcoding is handed to
+        the pool once the network part is done and a Future with the filename is
+        returned, so the calling thread is free for the next download.
+
+        trace is an optional JobTrace that gets a span per phase (see core.metrics).
+
+        With a FormatPolicy as policy, format_id/is_audio are picked by the
+        policy from the extracted formats instead of being passed in; the
+        extraction is reused for the download, so it happens once.
+
+        cancel is an optional CancelToken (see core.cancel). Once it is set the
+        download raises DownloadCancelled at its next progress update and,
+        unless cancelled with discard=False, removes the files it had written.
+        partials is an optional set that collects the paths of those files, for
+        callers that clean up after a failure themselves.
         """
-        self.on_progress_callback = progress_callback
-        self.on_complete_callback = complete_callback
-        
+        trace = trace or NULL_TRACE
+        if url is None:
+            url, info = self.url, self.info
+        with trace.span("validate"):
+            url = canonical_url(url)
+
+        # Every file yt-dlp writes for this download, removed again if it is cancelled
+        partials = partials if partials is not None else set()
+
+        def watch(d):
+            for key in ('tmpfilename', 'filename'):
+                if d.get(key):
+                    partials.add(d[key])
+            if cancel:
+                cancel.check()
+
+        def discard_partials():
+            if cancel.discard:
+                remove_partial_files(partials)
+
+        aliases = []
+        if policy is not None:
+            # The policy itself is indexed too, so repeating a policy download
+            # is answered from the library without extracting to pick a format
+            aliases.append((f"policy:{policy}", audio_profile(audio_format, audio_bitrate)))
+            existing = self.library.lookup(url, *aliases[0])
+            if existing:
+                return self._reuse(existing, download_path, progress_callback, complete_callback)
+            info, choice = self.apply_policy(url, info, policy, trace)
+            if cancel:
+                cancel.check()
+            format_id, is_audio = choice.format_id, choice.is_audio
+            audio_format = choice.audio_format or audio_format
+            audio_bitrate = choice.audio_bitrate or audio_bitrate
+
         try:
             logger.info(f"Starting download: {format_id} (Audio: {is_audio})")
             
             # Format Selection Strategy
             if is_audio:
-                # Download specific audio format (or best audio) and convert to mp3
+                # Download specific audio format (or best audio) and convert it
                 format_str = f"{format_id}" 
             else:
                 # Download video, merge with best audio if needed
@@ -138,48 +505,128 @@ class DownloaderHandler:
             ydl_opts = {
                 'format': format_str,
                 'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                'progress_hooks': [self._progress_hook],
+                'progress_hooks': [watch, lambda d: self._progress_hook(d, progress_callback)],
                 'quiet': True,
                 'no_warnings': True,
-                'overwrites': True,
+                'noprogress': True, # Progress goes through progress_hooks only
+                # Fresh downloads replace old files. Resumed ones keep what's there
+                # and continue any .part files from where they stopped.
+                'overwrites': not resume,
+                'continuedl': True,
                 'restrictfilenames': True, # Sanitize filenames
+                'logger': RetryCounter(), # Counts retries into the running span
             }
 
-            if is_audio:
-                # Convert to MP3
-                ydl_opts['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-            else:
+            if high_throughput:
+                ydl_opts.update(self.tuning.ydl_opts())
+
+            if not is_audio:
                 # Ensure output is MP4 (merge compatible)
                 ydl_opts['merge_output_format'] = 'mp4'
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # We need to re-pass the URL. self.url should be set from fetch_metadata
-                if not self.url:
-                    raise Exception("URL not set. Fetch metadata first.")
-
-                # download returns status code, not info. 
-                # To get filename, we need info.
-                info = ydl.extract_info(self.url, download=True)
-                filename = ydl.prepare_filename(info)
-                
-                # Adjust filename extension if post-processing changed it
-                if is_audio:
-                    base, _ = os.path.splitext(filename)
-                    filename = f"{base}.mp3"
-                elif ydl_opts.get('merge_output_format') == 'mp4':
-                     base, _ = os.path.splitext(filename)
-                     filename = f"{base}.mp4"
+            # We need to re-pass the URL. It is normally set from fetch_metadata
+            if not url:
+                raise Exception("URL not set. Fetch metadata first.")
+
+            # Same video, format and postprocessing downloaded before: reuse it
+            # without touching the network
+            profile = audio_profile(audio_format, audio_bitrate) if is_audio else "mp4"
+            existing = self.library.lookup(url, format_id, profile)
+            if existing:
+                return self._reuse(existing, download_path, progress_callback, complete_callback)
+
+            with load_yt_dlp().YoutubeDL(ydl_opts) as ydl:
+                if bandwidth:
+                    bandwidth.attach(ydl.params)
+
+                # Reuse the info dict from fetch_metadata so we don't pay for a
+                # second extraction. Only re-extract once signed URLs have expired.
+                if self._info_is_stale(info):
+                    logger.info("Cached info is stale, re-extracting.")
+                    with trace.span("extract"):
+                        info = ydl.extract_info(url, download=False)
+
+                # Strip the format selection results of the metadata fetch so
+                # yt-dlp re-runs selection with our format string.
+                info = ydl.sanitize_info(info, remove_private_keys=True)
+
+                # Postprocessing left for after the network part, as a callable
+                postprocess = None
+                with trace.span("select"):
+                    selected = None if is_audio else self._select_tracks(ydl, info)
+                    audio_source = self._select_audio_stream(ydl, info) if is_audio else None
+                if selected:
+                    if bandwidth:
+                        # Idle while the tracks download on their own instances
+                        bandwidth.detach(ydl.params)
+                    video_path, audio_path, filename = self._download_tracks(ydl, ydl_opts, info, selected, progress_callback, bandwidth, trace, watch)
+
+                    def postprocess():
+                        with trace.span("merge"):
+                            merge_tracks(video_path, audio_path, filename)
+                elif audio_source:
+                    base, _ = os.path.splitext(ydl.prepare_filename(audio_source))
+                    with trace.span("download", track=audio_source.get('format_id'), streamed=True) as span:
+                        def on_stream_progress(percentage, downloaded, total):
+                            span.bytes = downloaded
+                            if cancel:
+                                cancel.check()
+                            if progress_callback:
+                                progress_callback(percentage, downloaded, total)
+                        filename = stream_audio(ydl, audio_source, f"{base}.{audio_format}", audio_format, audio_bitrate, on_stream_progress)
+                else:
+                    with trace.span("download") as span:
+                        ydl.params['logger'].span = span
+                        info = ydl.process_ie_result(info, download=True)
+                        downloaded = info['requested_downloads'][0].get('filepath')
+                        if downloaded and os.path.exists(downloaded):
+                            span.bytes = os.path.getsize(downloaded)
+                    filename = ydl.prepare_filename(info)
+
+                    if is_audio:
+                        # Fragmented source (HLS/DASH): convert the downloaded file
+                        source = info['requested_downloads'][0]['filepath']
+                        base, _ = os.path.splitext(filename)
+                        filename = f"{base}.{audio_format}"
+
+                        def postprocess():
+                            with trace.span("postprocess"):
+                                extract_audio(source, filename, info.get('acodec'), audio_format, audio_bitrate)
+                    elif ydl_opts.get('merge_output_format') == 'mp4':
+                         # Adjust filename extension if merging changed it
+                         base, _ = os.path.splitext(filename)
+                         filename = f"{base}.mp4"
 
             logger.info("Download completed.")
-            if self.on_complete_callback:
-                self.on_complete_callback(filename)
-            
-            return filename
 
+            def finish():
+                try:
+                    if cancel:
+                        cancel.check()
+                    if postprocess:
+                        postprocess()
+                except DownloadCancelled:
+                    discard_partials()
+                    raise
+                try:
+                    self.library.record(url, format_id, profile, filename, aliases)
+                except OSError as e:
+                    logger.warning(f"Could not index download: {e}")
+                if progress_callback and os.path.exists(filename):
+                    size = os.path.getsize(filename)
+                    progress_callback(100, size, size)
+                if complete_callback:
+                    complete_callback(filename)
+                return filename
+
+            if postprocess and postprocessor is not None:
+                return postprocessor.submit(finish)
+            return finish()
+
+        except DownloadCancelled:
+            logger.info(f"Download cancelled: {url}")
+            discard_partials()
+            raise
         except Exception as e:
             logger.error(f"Download failed: {e}")
             raise e
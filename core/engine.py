@@ -0,0 +1,179 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.download_queue import DownloadQueue, DownloadJob, FINISHED, CANCELLED
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class JobHandle:
+    """
+    Awaitable handle of a submitted download: `filename = await handle`.
+    Awaiting a failed job raises its error, a cancelled one
+    asyncio.CancelledError. Cancelling the task that awaits the handle does
+    not cancel the job; call handle.cancel() for that.
+    """
+    def __init__(self, job, queue, future):
+        self.job = job
+        self._queue = queue
+        self._future = future
+
+    @property
+    def id(self):
+        return self.job.id
+
+    @property
+    def state(self):
+        return self.job.state
+
+    @property
+    def progress(self):
+        return self.job.progress
+
+    def cancel(self, discard=True):
+        """
+        Thread-safe. See DownloadQueue.cancel.
+        """
+        self._queue.cancel(self.job, discard)
+
+    def done(self):
+        return self._future.done()
+
+    async def result(self):
+        return await asyncio.shield(self._future)
+
+    def __await__(self):
+        return self.result().__await__()
+
+
+class Engine:
+    """
+    asyncio front end of the downloader. The blocking yt-dlp work runs on
+    managed threads: metadata fetches on a small pool of their own,
+    downloads on a DownloadQueue (with its scheduling, journal and
+    postprocessing pool). The event loop only holds a future per job, so one
+    loop can coordinate hundreds of them.
+
+        engine = Engine()
+        video_info, info = await engine.fetch(url)
+        handle = engine.submit(DownloadJob(url, format_id, path, info=info))
+        filename = await handle
+        await engine.close()
+
+    Methods must be called from the event loop's thread; EngineThread wraps
+    them for code that isn't async.
+    """
+    def __init__(self, handler=None, queue=None, fetch_workers=8, **queue_options):
+        if handler is None:
+            from core.downloader import DownloaderHandler
+            handler = DownloaderHandler()
+        self.handler = handler
+        self.queue = queue if queue is not None else DownloadQueue(handler, **queue_options)
+        self._fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix="engine-fetch")
+        self._pending = {} # job id -> future of a job that hasn't settled yet
+
+    async def fetch(self, url):
+        """
+        Resolves url to (VideoInfo, raw info dict), like DownloaderHandler.resolve.
+        Cancelling the caller returns control at once; the extraction running on
+        its thread is left to finish and its result dropped.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._fetch_pool, self.handler.resolve, url)
+
+    def submit(self, job):
+        """
+        Queues a DownloadJob and returns its JobHandle.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        previous = job.on_done
+
+        def on_done(job):
+            # Called from a download or postprocessing thread
+            if previous:
+                previous(job)
+            loop.call_soon_threadsafe(self._settle, job)
+
+        job.on_done = on_done
+        self._pending[job.id] = future
+        self.queue.submit(job)
+        return JobHandle(job, self.queue, future)
+
+    async def download(self, url, format_id=None, download_path=".", **job_options):
+        """
+        Downloads url and returns the filename. Keyword arguments go to DownloadJob
+        (e.g. is_audio, info, policy).
+        """
+        return await self.submit(DownloadJob(url, format_id, download_path, **job_options))
+
+    def _settle(self, job):
+        future = self._pending.pop(job.id, None)
+        if future is None or future.done():
+            return
+        if job.state == FINISHED:
+            future.set_result(job.filename)
+        elif job.state == CANCELLED:
+            future.cancel()
+        else:
+            future.set_exception(Exception(job.error))
+
+    async def close(self, interrupt=True, timeout=30):
+        """
+        Shuts the engine down. With interrupt=True, running downloads stop at
+        their next progress update and keep their partial files, and queued
+        ones stay journaled, so they resume on the next start; otherwise this
+        waits for the queue to drain first.
+        """
+        loop = asyncio.get_running_loop()
+        if not interrupt:
+            await loop.run_in_executor(None, self.queue.join)
+        await loop.run_in_executor(None, lambda: self.queue.shutdown(interrupt=interrupt, timeout=timeout))
+        self._fetch_pool.shutdown(wait=False)
+        # Jobs that will never run in this process
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+
+class EngineThread:
+    """
+    Runs an Engine on an event loop in a thread of its own, for callers that
+    aren't async (the Tk app, the CLI). Methods are thread-safe and return
+    concurrent.futures.Future objects.
+    """
+    def __init__(self, **engine_options):
+        self.loop = asyncio.new_event_loop()
+        self.engine = Engine(**engine_options)
+        self._thread = threading.Thread(target=self.loop.run_forever, name="engine-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def fetch(self, url):
+        """
+        Future of (VideoInfo, info dict). Cancel it to abandon the fetch.
+        """
+        return self.run(self.engine.fetch(url))
+
+    def submit(self, job):
+        """
+        Future of the job's filename.
+        """
+        async def submit_and_wait():
+            return await self.engine.submit(job)
+        return self.run(submit_and_wait())
+
+    def cancel(self, job, discard=True):
+        self.engine.queue.cancel(job, discard)
+
+    def close(self, interrupt=True, timeout=30):
+        try:
+            self.run(self.engine.close(interrupt, timeout)).result(timeout + 5)
+        except Exception as e:
+            logger.error(f"Engine did not shut down cleanly: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
@@ -0,0 +1,198 @@
+import sys
+from collections import Counter
+
+VIDEO = "video"
+AUDIO = "audio"
+
+# Default tie-breakers between formats of the same resolution, most
+# preferred first. H.264 plays everywhere an .mp4 does; direct HTTP downloads
+# can be fetched with several connections, HLS/DASH fragments can't.
+CODEC_PREFERENCE = ("avc1", "vp9", "vp09", "av01", "hev1", "hvc1")
+PROTOCOL_PREFERENCE = ("https", "http", "m3u8_native", "m3u8", "http_dash_segments")
+
+
+def _ranks(column, preference):
+    # Rank per row, higher is better; values outside the preference rank 0.
+    # Computed once per distinct value: a table has hundreds of rows but a handful of codecs.
+    ranks = {}
+    for value in set(column):
+        ranks[value] = 0
+        for i, name in enumerate(preference):
+            if value and value.startswith(name):
+                ranks[value] = len(preference) - i
+                break
+    return [ranks[value] for value in column]
+
+
+def video_score(table):
+    """
+    Default score column for picking one video format per resolution: higher
+    frame rate, then preferred protocol and codec, then bitrate.
+
+    A score function takes the whole table and returns one comparable value
+    per row, so it can work a column at a time instead of row by row.
+    """
+    return list(zip(
+        [fps or 0 for fps in table.fps],
+        _ranks(table.protocol, PROTOCOL_PREFERENCE),
+        _ranks(table.vcodec, CODEC_PREFERENCE),
+        [vbr or 0 for vbr in table.vbr],
+    ))
+
+
+def audio_score(table):
+    """
+    Default score column for picking one audio format per bitrate: preferred
+    protocol, then a known file size.
+    """
+    return list(zip(
+        _ranks(table.protocol, PROTOCOL_PREFERENCE),
+        [size is not None for size in table.filesize],
+    ))
+
+
+def format_filesize(size):
+    if not size:
+        return "Unknown Size"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class Stream:
+    """
+    One entry of a quality menu. Slotted and holding only numbers and short
+    shared strings, since thousands of VideoInfo objects can sit in queues
+    and caches at once; labels are computed when asked for.
+    """
+    __slots__ = ("itag", "type", "height", "fps", "abr", "vcodec", "acodec", "filesize", "protocol")
+
+    def __init__(self, itag, type, height=None, fps=None, abr=None, vcodec=None, acodec=None, filesize=None, protocol=None):
+        self.itag = itag # yt-dlp format ID
+        self.type = type # VIDEO or AUDIO
+        self.height = height
+        self.fps = fps
+        self.abr = abr # kbps
+        self.vcodec = vcodec
+        self.acodec = acodec
+        self.filesize = filesize # bytes, None if unknown
+        self.protocol = protocol
+
+    @property
+    def resolution(self):
+        """
+        '1080p', '720p60' or '128kbps'.
+        """
+        if self.type == AUDIO:
+            return f"{int(self.abr)}kbps"
+        if self.fps and self.fps > 30:
+            return f"{self.height}p{round(self.fps)}"
+        return f"{self.height}p"
+
+    @property
+    def label(self):
+        return f"{self.resolution} ({format_filesize(self.filesize)})"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def describe(self):
+        """
+        Public view for the CLI and the HTTP service. Numbers stay numbers
+        (filesize in bytes, None if unknown); resolution is the menu label.
+        """
+        return {"format_id": self.itag, "resolution": self.resolution, "height": self.height, "fps": self.fps,
+                "abr": self.abr, "vcodec": self.vcodec, "acodec": self.acodec, "filesize": self.filesize,
+                "protocol": self.protocol}
+
+    @classmethod
+    def from_dict(cls, data):
+        # Codec/protocol names repeat across every cached video; share one copy of each
+        return cls(**{name: sys.intern(value) if isinstance(value, str) else value for name, value in data.items()})
+
+
+def stream_menu(streams):
+    """
+    Maps menu label -> Stream, in menu order. Labels that would render the
+    same get the format ID appended, so every entry selects exactly one stream.
+    """
+    labels = [s.label for s in streams]
+    counts = Counter(labels)
+    menu = {}
+    for stream, label in zip(streams, labels):
+        if counts[label] > 1:
+            label = f"{label} [{stream.itag}]"
+        menu[label] = stream
+    return menu
+
+
+class FormatTable:
+    """
+    info['formats'] as columns of plain fields (numbers stay numbers), built
+    once, a column at a time. Selection and sorting work on row numbers and
+    compare numbers, never formatted strings.
+
+    Rows of formats that carry neither usable video (a height) nor audio (a
+    bitrate) get kind None and are skipped by the selectors.
+    """
+    def __init__(self, formats):
+        self.format_id = [f.get('format_id') for f in formats]
+        self.height = [f.get('height') for f in formats]
+        self.fps = [f.get('fps') for f in formats]
+        self.vbr = [f.get('vbr') or f.get('tbr') for f in formats]
+        self.abr = [f.get('abr') for f in formats]
+        self.vcodec = [f.get('vcodec') for f in formats]
+        self.acodec = [f.get('acodec') for f in formats]
+        self.filesize = [f.get('filesize') or f.get('filesize_approx') for f in formats]
+        self.protocol = [f.get('protocol') for f in formats]
+        self.kind = [
+            (AUDIO if acodec != 'none' and abr else None) if vcodec == 'none' else (VIDEO if height else None)
+            for vcodec, acodec, abr, height in zip(self.vcodec, self.acodec, self.abr, self.height)
+        ]
+
+    def __len__(self):
+        return len(self.format_id)
+
+    def _best_per(self, kind, keys, score):
+        # Row with the highest score per key, in ascending order of key
+        scores = score(self)
+        best = {} # key -> row
+        for row, row_kind in enumerate(self.kind):
+            if row_kind != kind:
+                continue
+            key = keys[row]
+            current = best.get(key)
+            if current is None or scores[row] > scores[current]:
+                best[key] = row
+        return [best[key] for key in sorted(best)]
+
+    def best_video(self, score=video_score):
+        """
+        Rows of the best video format per height, by the score column, in
+        ascending order of height.
+        """
+        return self._best_per(VIDEO, self.height, score)
+
+    def best_audio(self, score=audio_score):
+        """
+        Rows of the best audio-only format per whole kbps, in ascending order
+        of bitrate.
+        """
+        return self._best_per(AUDIO, [int(abr) if abr else None for abr in self.abr], score)
+
+    def stream(self, row):
+        return Stream(
+            self.format_id[row],
+            self.kind[row],
+            self.height[row],
+            self.fps[row],
+            self.abr[row],
+            self.vcodec[row],
+            self.acodec[row],
+            self.filesize[row],
+            self.protocol[row],
+        )
+
+    def video_streams(self, score=video_score):
+        return [self.stream(row) for row in self.best_video(score)]
+
+    def audio_streams(self, score=audio_score):
+        return [self.stream(row) for row in self.best_audio(score)]
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Jobs in these states were interrupted and get resumed on the next start
+UNFINISHED_STATES = ("queued", "active", "postprocessing")
+# Failed jobs are resumed too, until they have failed this many times
+MAX_ATTEMPTS = 3
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS {table} ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " url TEXT NOT NULL,"
+    " format_id TEXT," # NULL when a policy picks the format
+    " download_path TEXT NOT NULL,"
+    " is_audio INTEGER NOT NULL,"
+    " audio_format TEXT NOT NULL DEFAULT 'mp3',"
+    " audio_bitrate INTEGER NOT NULL DEFAULT 192,"
+    " policy TEXT,"
+    " high_throughput INTEGER NOT NULL,"
+    " title TEXT,"
+    " grp TEXT,"
+    " priority TEXT NOT NULL DEFAULT 'background',"
+    " weight REAL NOT NULL DEFAULT 1,"
+    " state TEXT NOT NULL,"
+    " downloaded INTEGER NOT NULL DEFAULT 0,"
+    " total INTEGER NOT NULL DEFAULT 0,"
+    " error TEXT,"
+    " attempts INTEGER NOT NULL DEFAULT 0,"
+    " partials TEXT,"
+    " updated_at REAL NOT NULL)"
+)
+
+
+class JobJournal:
+    """
+    Durable record of queued and running downloads, so jobs survive a crash
+    or the app being closed. Each row holds what's needed to restart the job
+    (URL, chosen format, output folder) plus the last known byte offset.
+    Finished jobs are removed; yt-dlp picks up the leftover .part files of
+    unfinished ones when they are resumed. A failed job (say, the network
+    was down) is resumed as well until it has failed max_attempts times,
+    then removed; the queue deletes its partial files at that point.
+    """
+    def __init__(self, path=os.path.join("data", "jobs.db"), flush_interval=2.0, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.flush_interval = flush_interval # Min seconds between offset writes per job
+        self.max_attempts = max_attempts
+        self._last_flush = {}
+        self._lock = threading.Lock()
+
+        journal_dir = os.path.dirname(path)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA.format(table="jobs"))
+        # Journals written before audio options existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "audio_format" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN audio_format TEXT NOT NULL DEFAULT 'mp3'")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN audio_bitrate INTEGER NOT NULL DEFAULT 192")
+        # ...and before format policies
+        if "policy" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN policy TEXT")
+        # ...and before failed jobs were retried. Failed rows from then have no
+        # record of their files and would only pile up, so they go.
+        if "attempts" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN partials TEXT")
+            self._conn.execute("DELETE FROM jobs WHERE state = 'failed'")
+        # ...and before priorities were kept (restored jobs all went to the background)
+        if "priority" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN priority TEXT NOT NULL DEFAULT 'background'")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN weight REAL NOT NULL DEFAULT 1")
+        # ...and when format_id was NOT NULL, with 'None' stored for policy
+        # jobs. SQLite can't drop a constraint, so the table is copied.
+        info = {row[1]: row[3] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if info["format_id"]:
+            names = ", ".join(info)
+            self._conn.execute("DROP TABLE IF EXISTS jobs_old")
+            self._conn.execute("ALTER TABLE jobs RENAME TO jobs_old")
+            self._conn.execute(SCHEMA.format(table="jobs"))
+            self._conn.execute(f"INSERT INTO jobs ({names}) SELECT {names} FROM jobs_old")
+            self._conn.execute("DROP TABLE jobs_old")
+            self._conn.execute("UPDATE jobs SET format_id = NULL WHERE format_id = 'None' AND policy IS NOT NULL")
+        self._conn.commit()
+
+    def record(self, job):
+        """
+        Inserts or updates the row for a job. Sets job.journal_id on first call.
+        """
+        now = time.time()
+        with self._lock:
+            if job.state in ("finished", "cancelled") or (job.state == "failed" and job.attempts >= self.max_attempts):
+                if job.journal_id is not None:
+                    self._conn.execute("DELETE FROM jobs WHERE id = ?", (job.journal_id,))
+                    self._last_flush.pop(job.journal_id, None)
+            elif job.journal_id is None:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (url, format_id, download_path, is_audio, audio_format, audio_bitrate, policy, high_throughput,"
+                    " title, grp, priority, weight, state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job.url, None if job.format_id is None else str(job.format_id), job.download_path, int(job.is_audio),
+                     job.audio_format, job.audio_bitrate, job.policy and str(job.policy), int(job.high_throughput), job.title,
+                     job.group, job.priority, job.weight, job.state, now),
+                )
+                job.journal_id = cursor.lastrowid
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, downloaded = ?, total = ?, error = ?, attempts = ?, partials = ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (job.state, job.downloaded, job.total, job.error, job.attempts, json.dumps(sorted(job.partials)), now,
+                     job.journal_id),
+                )
+            self._conn.commit()
+
+    def record_progress(self, job):
+        """
+        Saves the current byte offset, at most once per flush_interval per job.
+        """
+        if job.journal_id is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_flush.get(job.journal_id, 0) < self.flush_interval:
+                return
+            self._last_flush[job.journal_id] = now
+            self._conn.execute(
+                "UPDATE jobs SET downloaded = ?, total = ?, updated_at = ? WHERE id = ?",
+                (job.downloaded, job.total, time.time(), job.journal_id),
+            )
+            self._conn.commit()
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, format_id, download_path, is_audio, audio_format, audio_bitrate, policy, high_throughput, title, grp,"
+                " priority, weight, downloaded, total, attempts, partials"
+                " FROM jobs WHERE state IN (?, ?, ?) OR (state = 'failed' AND attempts < ?) ORDER BY id",
+                UNFINISHED_STATES + (self.max_attempts,),
+            ).fetchall()
+        keys = ("id", "url", "format_id", "download_path", "is_audio", "audio_format", "audio_bitrate", "policy",
+                "high_throughput", "title", "group", "priority", "weight", "downloaded", "total", "attempts", "partials")
+        jobs = [dict(zip(keys, row)) for row in rows]
+        for job in jobs:
+            job["partials"] = json.loads(job["partials"]) if job["partials"] else []
+        return jobs
+
+    def forget(self, journal_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (journal_id,))
+            self._conn.commit()
@@ -0,0 +1,149 @@
+import hashlib
+import itertools
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from core.cache import cache_key
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def same_content(path, other):
+    """
+    True if other is path itself (or a hardlink of it) or has the same bytes.
+    """
+    if os.path.samefile(path, other):
+        return True
+    return os.path.getsize(path) == os.path.getsize(other) and file_sha256(path) == file_sha256(other)
+
+
+class DownloadIndex:
+    """
+    Index of completed downloads, keyed by (canonical video, format ID,
+    postprocessing profile) rather than by filename, so a renamed video still
+    matches and two videos that sanitize to the same filename never do.
+
+    Each entry keeps the file's size, mtime and SHA-256. A lookup only counts
+    as a hit if the file on disk still has the recorded size and mtime. When
+    those changed (e.g. another video overwrote the file), the hash settles it.
+    """
+    def __init__(self, path=os.path.join("data", "downloads.db")):
+        self.path = path
+        self._lock = threading.Lock()
+
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            " video_key TEXT NOT NULL,"
+            " format_id TEXT NOT NULL,"
+            " profile TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime REAL NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (video_key, format_id, profile))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS downloads_path ON downloads (path)")
+        self._conn.commit()
+
+    def lookup(self, url, format_id, profile):
+        """
+        Returns the path of a verified earlier download, or None.
+        """
+        key = (cache_key(url), str(format_id), profile)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, mtime, sha256 FROM downloads WHERE video_key = ? AND format_id = ? AND profile = ?",
+                key,
+            ).fetchone()
+        if row is None:
+            return None
+
+        path, size, mtime, sha256 = row
+        if self._verify(path, size, mtime, sha256):
+            return path
+
+        logger.info(f"Dropping stale download index entry for {path}")
+        with self._lock:
+            self._conn.execute("DELETE FROM downloads WHERE video_key = ? AND format_id = ? AND profile = ?", key)
+            self._conn.commit()
+        return None
+
+    @staticmethod
+    def _verify(path, size, mtime, sha256):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime == mtime:
+            return True
+        # Touched but maybe not changed (copied back, restored from backup...)
+        return file_sha256(path) == sha256
+
+    def record(self, url, format_id, profile, path, aliases=()):
+        """
+        Indexes a finished download. aliases are further (format_id, profile)
+        keys that lead to the same file, e.g. the format policy that picked it.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        sha256 = file_sha256(path)
+        now = time.time()
+        with self._lock:
+            # Whatever was recorded at this path before has just been overwritten
+            self._conn.execute("DELETE FROM downloads WHERE path = ?", (path,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO downloads (video_key, format_id, profile, path, size, mtime, sha256, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(cache_key(url), str(key_format), key_profile, path, stat.st_size, stat.st_mtime, sha256, now)
+                 for key_format, key_profile in [(format_id, profile), *aliases]],
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def materialize(source, download_path):
+        """
+        Makes an existing download available in download_path: returns it as is
+        when it's already there, otherwise hardlinks it (or copies it across
+        filesystems) under the same name. When a different file has that name,
+        it goes next to it under a name tagged with a hash of the source path;
+        a file already there is only reused if it has the source's content.
+        """
+        os.makedirs(download_path, exist_ok=True) # yt-dlp would have created it for a fresh download
+        target = os.path.join(download_path, os.path.basename(source))
+        if os.path.exists(target) and os.path.samefile(source, target):
+            return target
+        if os.path.exists(target):
+            # A different file has this name already; keep both
+            base, ext = os.path.splitext(target)
+            tag = hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]
+            for n in itertools.count():
+                target = f"{base}.{tag}{f'-{n}' if n else ''}{ext}"
+                if not os.path.exists(target):
+                    break
+                if same_content(source, target):
+                    return target
+
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+        return target
@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from utils.logger import BACKUP_COUNT, DailyRotatingFileHandler, setup_logger
+
+logger = setup_logger()
+
+# Phases a job goes through, in order. Spans use these names so the
+# Prometheus dump has a fixed set of labels.
+PHASES = ("queued", "validate", "extract", "select", "download", "merge", "postprocess")
+
+
+class Span:
+    """
+    One timed phase of a job. Used as a context manager; bytes, retries and
+    free-form attributes can be filled in while it runs. An exception leaving
+    the block marks the span as failed.
+    """
+    def __init__(self, tracer, job, phase, attrs):
+        self.tracer = tracer
+        self.job = job
+        self.phase = phase
+        self.attrs = attrs
+        self.bytes = 0
+        self.retries = 0
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        self.tracer.record(self, error=None if exc is None else str(exc))
+        return False
+
+    def to_dict(self, error=None):
+        return {
+            "job": self.job,
+            "phase": self.phase,
+            "start": round(self.start, 3),
+            "duration": round(self.duration, 4),
+            "bytes": self.bytes,
+            "throughput": round(self.bytes / self.duration) if self.bytes and self.duration else 0,
+            "retries": self.retries,
+            "status": "error" if error else "ok",
+            **({"error": error} if error else {}),
+            **self.attrs,
+        }
+
+
+class JobTrace:
+    """
+    Spans of a single job. handler/queue code calls trace.span(phase) and
+    never needs to know whether tracing is on.
+    """
+    def __init__(self, tracer, job):
+        self.tracer = tracer
+        self.job = job
+
+    def span(self, phase, **attrs):
+        return Span(self.tracer, self.job, phase, attrs)
+
+    def record(self, phase, start, duration, **attrs):
+        """
+        Records a phase measured elsewhere (e.g. time spent waiting in the queue).
+        """
+        span = Span(self.tracer, self.job, phase, attrs)
+        span.start, span.duration = start, duration
+        self.tracer.record(span)
+
+
+class _NullSpan:
+    bytes = 0
+    retries = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _NullTrace:
+    def span(self, phase, **attrs):
+        return _NullSpan()
+
+    def record(self, phase, start, duration, **attrs):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Tracer:
+    """
+    Collects job spans. Every finished span is appended to `path` as one
+    JSON line (if given) and passed to `on_span` (if given), and is folded
+    into per-phase totals that prometheus_text() renders in the Prometheus
+    text format.
+
+    With max_bytes the file rotates like the app log: by size and by day,
+    keeping backup_count old files.
+    """
+    def __init__(self, path=None, on_span=None, max_bytes=None, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.on_span = on_span
+        self._totals = {} # phase -> [count, errors, seconds, bytes, retries]
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            span_dir = os.path.dirname(path)
+            if span_dir and not os.path.exists(span_dir):
+                os.makedirs(span_dir)
+            if max_bytes:
+                self._file = DailyRotatingFileHandler(path, max_bytes, backup_count)
+            else:
+                self._file = logging.FileHandler(path, encoding="utf-8", delay=True)
+            self._file.setFormatter(logging.Formatter("%(message)s"))
+
+    def job(self, job):
+        return JobTrace(self, job)
+
+    def record(self, span, error=None):
+        data = span.to_dict(error)
+        line = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            totals = self._totals.setdefault(span.phase, [0, 0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += 1 if error else 0
+            totals[2] += span.duration
+            totals[3] += span.bytes
+            totals[4] += span.retries
+            if self._file:
+                self._file.handle(logging.makeLogRecord({"msg": line}))
+        if self.on_span:
+            try:
+                self.on_span(data)
+            except Exception as e:
+                logger.error(f"Span callback failed: {e}")
+
+    def prometheus_text(self):
+        with self._lock:
+            totals = {phase: list(values) for phase, values in self._totals.items()}
+        metrics = [
+            ("downloader_phase_seconds", "summary", "Time spent in each job phase", None),
+            ("downloader_phase_errors_total", "counter", "Phases that ended in an error", 1),
+            ("downloader_phase_bytes_total", "counter", "Bytes transferred per phase", 3),
+            ("downloader_phase_retries_total", "counter", "Retries per phase", 4),
+        ]
+        lines = []
+        for name, kind, help_text, index in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for phase in sorted(totals, key=lambda p: PHASES.index(p) if p in PHASES else len(PHASES)):
+                values = totals[phase]
+                if index is None:
+                    lines.append(f'{name}_count{{phase="{phase}"}} {values[0]}')
+                    lines.append(f'{name}_sum{{phase="{phase}"}} {values[2]:.6f}')
+                else:
+                    lines.append(f'{name}{{phase="{phase}"}} {values[index]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves prometheus_text() at http://host:port/metrics from a daemon thread.
+        Returns the server (call shutdown() to stop it).
+        """
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+        return server
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+class RetryCounter:
+    """
+    Passed to yt-dlp as params['logger']: counts the 'Retrying' warnings its
+    downloaders emit into the current span and drops everything else, like
+    quiet mode. span can be set (or swapped) after the YoutubeDL is created.
+    """
+    def __init__(self, span=None):
+        self.span = span
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        if self.span is not None and "Retrying" in msg:
+            self.span.retries += 1
+
+    def error(self, msg):
+        logger.error(msg)
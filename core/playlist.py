@@ -0,0 +1,104 @@
+import threading
+import time
+from core.download_queue import QUEUED
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Format selectors for entries queued without fetching their metadata first;
+# the download worker extracts each video when its turn comes.
+BEST_VIDEO = "bestvideo"
+BEST_AUDIO = "bestaudio"
+
+
+class IsPlaylist(Exception):
+    """
+    Raised by DownloaderHandler.resolve for playlist and channel URLs, which
+    are enumerated with iter_entries instead of extracted as one video.
+    """
+    def __init__(self, url, title):
+        super().__init__(f"{url} is a playlist or channel")
+        self.url = url
+        self.title = title
+
+
+class PlaylistEntry:
+    """
+    One video of a playlist or channel, as listed by flat extraction: enough
+    to queue it, without any format information.
+    """
+    __slots__ = ("id", "url", "title", "duration", "index", "source")
+
+    def __init__(self, id, url, title=None, duration=None, index=None, source=None):
+        self.id = id
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.index = index # 1-based position in the enumeration
+        self.source = source # URL of the playlist or channel tab that listed it
+
+    def to_dict(self):
+        return {"id": self.id, "url": self.url, "title": self.title, "duration": self.duration, "index": self.index, "source": self.source}
+
+
+class PlaylistFeeder:
+    """
+    Enumerates a playlist or channel on a background thread and submits a
+    download job per entry as soon as it is listed, so the first video starts
+    while later pages haven't been fetched yet.
+
+    make_job(entry) returns the DownloadJob for an entry. Enumeration pauses
+    while `window` of this feeder's jobs are still waiting in the queue, so a
+    5,000-video channel never has more than a handful of entries in memory
+    ahead of the workers.
+    """
+    def __init__(self, handler, queue, make_job, window=None, poll_interval=0.25):
+        self.handler = handler
+        self.queue = queue
+        self.make_job = make_job
+        self.window = window or queue.max_workers * 2
+        self.poll_interval = poll_interval
+        self.enumerated = 0
+        self._waiting = [] # Submitted jobs that may still be queued
+        self._stopped = False
+
+    def start(self, url, limit=None, on_entry=None, on_done=None, entries=None):
+        """
+        Starts enumerating in the background and returns the thread.
+        on_entry(entry, job) is called for each queued entry, on_done(error) at the end.
+        entries replaces handler.iter_entries(url), e.g. with a filtered iterator.
+        """
+        thread = threading.Thread(target=self._run, args=(url, limit, on_entry, on_done, entries), name="playlist-feeder", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stopped = True
+
+    def _run(self, url, limit, on_entry, on_done, entries):
+        error = None
+        try:
+            for entry in entries if entries is not None else self.handler.iter_entries(url):
+                self._wait_for_room()
+                if self._stopped:
+                    break
+                job = self.queue.submit(self.make_job(entry))
+                self.enumerated += 1
+                self._waiting.append(job)
+                if on_entry:
+                    on_entry(entry, job)
+                if limit and self.enumerated >= limit:
+                    break
+            logger.info(f"Playlist enumeration finished: {self.enumerated} entries from {url}")
+        except Exception as e:
+            logger.error(f"Playlist enumeration failed: {e}")
+            error = str(e)
+        if on_done:
+            on_done(error)
+
+    def _wait_for_room(self):
+        while not self._stopped:
+            self._waiting = [j for j in self._waiting if j.state == QUEUED]
+            if len(self._waiting) < self.window:
+                return
+            time.sleep(self.poll_interval)
@@ -0,0 +1,190 @@
+import re
+from collections import namedtuple
+from core.audio import AUDIO_TARGETS
+from core.formats import AUDIO, VIDEO, FormatTable, audio_score, video_score
+from utils.urls import PLATFORM_DOMAINS, platform_of
+
+# Quality policy per platform (the names in utils.urls.PLATFORM_DOMAINS,
+# plus "default"). Alternatives are tried left to right; the first that matches
+# any format wins. See FormatPolicy for the syntax.
+DEFAULT_POLICIES = {
+    "default": "video[height<=1080][vcodec^=avc1][size<=?2G] / video[height<=1080] / video / audio",
+    "youtube": "video[height<=1080][vcodec^=avc1][size<=?2G] / video[height<=1080] / audio",
+    "tiktok": "video / audio",
+    "instagram": "video / audio",
+}
+
+# Format table column behind each filter field
+FIELDS = {
+    "height": "height",
+    "fps": "fps",
+    "vbr": "vbr",
+    "abr": "abr",
+    "size": "filesize",
+    "filesize": "filesize",
+    "vcodec": "vcodec",
+    "acodec": "acodec",
+    "protocol": "protocol",
+}
+NUMERIC_FIELDS = {"height", "fps", "vbr", "abr", "filesize"}
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+OPERATORS = {
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+    "!=": lambda a, b: a != b,
+    "^=": lambda a, b: a.startswith(b),
+    "*=": lambda a, b: b in a,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "=": lambda a, b: a == b,
+}
+
+_FILTER_RE = re.compile(r"\[\s*(\w+)\s*(<=|>=|!=|\^=|\*=|<|>|=)(\?)?\s*([^\]]+?)\s*\]")
+_ALTERNATIVE_RE = re.compile(r"^(video|audio)(?::(\w+))?(?:@(\d+))?\s*((?:\[[^\]]*\]\s*)*)$")
+
+# Result of a policy: the format to download and, for audio, what to convert it to.
+# audio_format/audio_bitrate are None when the policy leaves them to the caller.
+Choice = namedtuple("Choice", ["format_id", "is_audio", "audio_format", "audio_bitrate"])
+
+
+class PolicyError(ValueError):
+    pass
+
+
+class _Filter:
+    __slots__ = ("column", "test", "value", "allow_unknown")
+
+    def __init__(self, field, op, allow_unknown, value):
+        if field not in FIELDS:
+            raise PolicyError(f"Unknown field '{field}', expected one of: {', '.join(FIELDS)}")
+        self.column = FIELDS[field]
+        self.test = OPERATORS[op]
+        self.allow_unknown = bool(allow_unknown) # [size<=?500M]: formats of unknown size pass
+        if self.column in NUMERIC_FIELDS:
+            if op in ("^=", "*="):
+                raise PolicyError(f"'{op}' only works on text fields, not '{field}'")
+            match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG]?)i?B?", value, re.IGNORECASE)
+            if not match:
+                raise PolicyError(f"'{value}' is not a number")
+            self.value = float(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+        else:
+            self.value = value
+
+    def mask(self, table):
+        test, value, allow_unknown = self.test, self.value, self.allow_unknown
+        return [allow_unknown if v is None else test(v, value) for v in getattr(table, self.column)]
+
+
+class _Alternative:
+    __slots__ = ("kind", "filters", "audio_format", "audio_bitrate")
+
+    def __init__(self, text):
+        match = _ALTERNATIVE_RE.match(text.strip())
+        if not match:
+            raise PolicyError(f"Can't parse '{text.strip()}', expected e.g. video[height<=1080] or audio:mp3@192")
+        kind, audio_format, bitrate, filters = match.groups()
+        if kind == VIDEO and (audio_format or bitrate):
+            raise PolicyError(f"Only audio takes an output format and bitrate: '{text.strip()}'")
+        if audio_format and audio_format not in AUDIO_TARGETS:
+            raise PolicyError(f"Unknown audio format '{audio_format}', expected one of: {', '.join(sorted(AUDIO_TARGETS))}")
+        self.kind = kind
+        self.audio_format = audio_format
+        self.audio_bitrate = int(bitrate) if bitrate else None
+        parsed = _FILTER_RE.findall(filters)
+        if len(parsed) != filters.count("["):
+            raise PolicyError(f"Can't parse the filters in '{text.strip()}'")
+        self.filters = [_Filter(*f) for f in parsed]
+
+    def choose(self, table, video_scores, audio_scores):
+        rows = [row for row, kind in enumerate(table.kind) if kind == self.kind]
+        for f in self.filters:
+            mask = f.mask(table)
+            rows = [row for row in rows if mask[row]]
+        if not rows:
+            return None
+        if self.kind == VIDEO:
+            # Highest resolution first, then the usual tie-breakers
+            row = max(rows, key=lambda r: (table.height[r], video_scores[r]))
+        else:
+            row = max(rows, key=lambda r: (table.abr[r], audio_scores[r]))
+        return Choice(table.format_id[row], self.kind == AUDIO, self.audio_format, self.audio_bitrate)
+
+
+class FormatPolicy:
+    """
+    Picks a format straight from yt-dlp's format list, so a URL can be queued
+    without fetching its metadata and picking from a menu first.
+
+    A policy is a list of alternatives separated by '/', tried in order,
+    in the style of yt-dlp's format filters:
+
+        video[height<=1080][vcodec^=avc1][size<=500M] / video[height<=1080] / audio:mp3@192
+
+    Each alternative is 'video' or 'audio' (optionally ':FORMAT@KBPS' for
+    the converted file) followed by filters on height, fps, vbr, abr, size,
+    vcodec, acodec or protocol with <, <=, >, >=, =, != (numbers) or
+    =, !=, ^= (prefix), *= (contains) for text. Sizes take K/M/G. A '?'
+    after the operator lets formats with the field unknown through, e.g.
+    [size<=?2G]. Among the formats that match, the highest resolution
+    (or bitrate) wins, ties broken like the quality menus.
+    """
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        self.alternatives = [_Alternative(text) for text in self.spec.split("/")]
+
+    def choose(self, formats):
+        """
+        Returns the Choice for a list of yt-dlp format dicts (or a
+        FormatTable), or None if no alternative matches.
+        """
+        table = formats if isinstance(formats, FormatTable) else FormatTable(formats)
+        video_scores, audio_scores = video_score(table), audio_score(table)
+        for alternative in self.alternatives:
+            choice = alternative.choose(table, video_scores, audio_scores)
+            if choice is not None:
+                return choice
+        return None
+
+    def __str__(self):
+        return self.spec
+
+
+class PolicySet:
+    """
+    The policy for each platform: DEFAULT_POLICIES with overrides, given as
+    {platform: spec} (the "default" key applies to every platform without
+    its own entry).
+    """
+    def __init__(self, overrides=None):
+        specs = dict(DEFAULT_POLICIES)
+        if overrides:
+            if "default" in overrides:
+                # An explicit default replaces the built-in per-platform ones too
+                specs = {}
+            specs.update(overrides)
+        unknown = set(specs) - set(PLATFORM_DOMAINS.values()) - {"default"}
+        if unknown:
+            raise PolicyError(f"Unknown platform: {', '.join(sorted(unknown))}")
+        self.policies = {platform: FormatPolicy(spec) for platform, spec in specs.items()}
+        self.policies.setdefault("default", FormatPolicy(DEFAULT_POLICIES["default"]))
+
+    @classmethod
+    def parse(cls, values):
+        """
+        Builds a PolicySet from command line values, each 'SPEC' (for every
+        platform) or 'PLATFORM=SPEC'. 'auto' alone means the defaults.
+        """
+        overrides = {}
+        for value in values or ():
+            if value == "auto":
+                continue
+            platform, sep, spec = value.partition("=")
+            if sep and re.fullmatch(r"\w+", platform.strip()):
+                overrides[platform.strip()] = spec
+            else:
+                overrides["default"] = value
+        return cls(overrides)
+
+    def for_url(self, url):
+        return self.policies.get(platform_of(url), self.policies["default"])
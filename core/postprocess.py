@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class StageStats:
+    """
+    Busy time of a pool of workers, for tuning pool sizes. Utilization is the
+    share of worker time spent on work since the stage was created: near 1.0
+    the stage is the bottleneck, near 0.0 it has more workers than it needs.
+    """
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.busy = 0 # Workers currently working
+        self.completed = 0
+        self.failed = 0
+        self._busy_seconds = 0.0
+        self._started = {} # thread ident -> start time of the current task
+        self._created = time.monotonic()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.busy += 1
+            self._started[threading.get_ident()] = time.monotonic()
+
+    def end(self, ok=True):
+        with self._lock:
+            self.busy -= 1
+            self._busy_seconds += time.monotonic() - self._started.pop(threading.get_ident())
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def to_dict(self, queued=0):
+        with self._lock:
+            now = time.monotonic()
+            # Count the running tasks up to now, not just the finished ones
+            busy_seconds = self._busy_seconds + sum(now - t for t in self._started.values())
+            elapsed = max(now - self._created, 1e-9)
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "utilization": round(min(busy_seconds / (elapsed * self.workers), 1.0), 3),
+            }
+
+
+class PostprocessPool:
+    """
+    Runs CPU-bound postprocessing (ffmpeg merges and transcodes) on its own
+    workers, so download workers hand the files over and move on to the next
+    job instead of waiting for ffmpeg.
+
+    The heavy lifting happens in the ffmpeg child processes; the workers only
+    start and wait on them, so threads are enough and the pool is sized to
+    the number of cores. Pending tasks are bounded: when ffmpeg can't keep
+    up, submit() blocks and slows the download stage down with it. The
+    bound is a semaphore rather than the queue's maxsize, so shutdown()
+    can always queue the workers' stop signals without waiting.
+    """
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(max_pending or self.max_workers * 2) # Free places for pending tasks
+        self._lock = threading.Lock()
+        self._cancelled = False # Set by shutdown(cancel_futures=True): nothing submitted now would run
+        self.stage = StageStats("postprocess", self.max_workers)
+        self._workers = []
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"postprocess-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns a Future with its result.
+        Blocks while the pending queue is full. After shutdown(cancel_futures=True)
+        the Future comes back cancelled.
+        """
+        future = Future()
+        self._slots.acquire()
+        with self._lock:
+            if not self._cancelled:
+                self._queue.put((future, fn, args, kwargs))
+                return future
+        self._slots.release()
+        future.cancel()
+        return future
+
+    def _worker_loop(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            self._slots.release()
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            self.stage.begin()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                self.stage.end(ok=False)
+                logger.error(f"Postprocessing failed: {e}")
+                future.set_exception(e)
+            else:
+                self.stage.end()
+                future.set_result(result)
+
+    def stats(self):
+        return self.stage.to_dict(queued=self._queue.qsize())
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        Stops the workers once the pending tasks are done, or, with
+        cancel_futures, cancels the pending ones and stops them after the
+        tasks already running. Only waits for that with wait=True.
+        """
+        dropped = []
+        with self._lock:
+            if cancel_futures:
+                self._cancelled = True
+                while True:
+                    try:
+                        task = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if task is not None:
+                        self._slots.release()
+                        dropped.append(task[0])
+            for _ in self._workers:
+                self._queue.put(None)
+        for future in dropped:
+            future.cancel() # Runs its done callbacks, so outside the lock
+        if wait:
+            for worker in self._workers:
+                worker.join()
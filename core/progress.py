@@ -0,0 +1,156 @@
+import threading
+import time
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class ProgressSnapshot:
+    def __init__(self, key, downloaded, total, speed, eta):
+        self.key = key
+        self.downloaded = downloaded
+        self.total = total
+        self.speed = speed # bytes/sec, smoothed
+        self.eta = eta # seconds, or None if unknown
+
+    @property
+    def percent(self):
+        return (self.downloaded / self.total) * 100 if self.total else 0.0
+
+    def to_dict(self):
+        return {
+            "percent": round(self.percent, 1),
+            "downloaded": self.downloaded,
+            "total": self.total,
+            "speed": round(self.speed),
+            "eta": None if self.eta is None else round(self.eta),
+        }
+
+
+class _Track:
+    __slots__ = ("downloaded", "total", "stamp", "last_bytes", "last_stamp", "speed")
+
+    def __init__(self):
+        self.downloaded = 0
+        self.total = 0
+        self.stamp = 0.0
+        self.last_bytes = 0
+        self.last_stamp = None
+        self.speed = 0.0
+
+
+class ProgressAggregator:
+    """
+    Collects raw progress ticks from any number of downloads and hands them out
+    coalesced, at most once per frame.
+
+    update() only stores the latest numbers, so it costs the same no matter how
+    often yt-dlp fires its hook. Speed and ETA are worked out in drain(), once
+    per frame, with an exponential moving average to keep them steady.
+    GUI code calls drain() from its own timer; other consumers can subscribe()
+    and start() a background ticker instead.
+    """
+    def __init__(self, fps=10, smoothing=0.3):
+        self.interval = 1.0 / fps
+        self.smoothing = smoothing
+        self._tracks = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._ticker = None
+        self._stopped = threading.Event()
+
+    def update(self, key, downloaded, total):
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = self._tracks[key] = _Track()
+            track.downloaded = downloaded
+            track.total = total
+            track.stamp = time.monotonic()
+            self._dirty.add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._tracks.pop(key, None)
+            self._dirty.discard(key)
+
+    def drain(self):
+        """
+        Returns snapshots for every key that changed since the last call.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = []
+            for key in dirty:
+                track = self._tracks.get(key)
+                if track is None:
+                    continue
+                snapshots.append(self._snapshot(key, track))
+        return snapshots
+
+    def _snapshot(self, key, track):
+        if track.last_stamp is None or track.downloaded < track.last_bytes:
+            # First tick, or a new file started (e.g. audio after video)
+            track.last_bytes = track.downloaded
+            track.last_stamp = track.stamp
+        else:
+            elapsed = track.stamp - track.last_stamp
+            if elapsed > 0:
+                rate = (track.downloaded - track.last_bytes) / elapsed
+                track.speed = rate if track.speed == 0 else (self.smoothing * rate + (1 - self.smoothing) * track.speed)
+                track.last_bytes = track.downloaded
+                track.last_stamp = track.stamp
+
+        eta = None
+        if track.speed > 0 and track.total:
+            eta = max(track.total - track.downloaded, 0) / track.speed
+        return ProgressSnapshot(key, track.downloaded, track.total, track.speed, eta)
+
+    def subscribe(self, callback):
+        """
+        callback(list of ProgressSnapshot) is called from the ticker thread.
+        """
+        self._subscribers.append(callback)
+
+    def start(self):
+        if self._ticker is None:
+            self._ticker = threading.Thread(target=self._tick_loop, name="progress-ticker", daemon=True)
+            self._ticker.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.join()
+            self._ticker = None
+        self._publish() # Flush the last frame
+
+    def _tick_loop(self):
+        while not self._stopped.wait(self.interval):
+            self._publish()
+
+    def _publish(self):
+        snapshots = self.drain()
+        if not snapshots:
+            return
+        for callback in self._subscribers:
+            try:
+                callback(snapshots)
+            except Exception as e:
+                logger.error(f"Progress subscriber failed: {e}")
+
+
+def format_speed(speed):
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if speed < 1024:
+            return f"{speed:.0f} {unit}"
+        speed /= 1024
+    return f"{speed:.1f} GB/s"
+
+
+def format_eta(eta):
+    if eta is None:
+        return "--:--"
+    minutes, seconds = divmod(int(eta), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+from core.download_queue import FINISHED
+from core.playlist import PlaylistFeeder
+from utils.logger import setup_logger
+from utils.urls import canonical_key, lists_newest_first
+
+logger = setup_logger()
+
+
+class ArchiveIndex:
+    """
+    IDs of the videos already archived from each source (channel, playlist).
+    One compact row per video: the (source, video_id) primary key is the
+    whole table, so checking an ID is a single index lookup.
+    """
+    def __init__(self, path=os.path.join("data", "archive.db")):
+        self.path = path
+        self._lock = threading.Lock()
+
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archived ("
+            " source TEXT NOT NULL,"
+            " video_id TEXT NOT NULL,"
+            " archived_at REAL NOT NULL,"
+            " PRIMARY KEY (source, video_id)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def contains(self, source, video_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM archived WHERE source = ? AND video_id = ?", (source, video_id)
+            ).fetchone()
+        return row is not None
+
+    def add(self, source, video_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO archived (source, video_id, archived_at) VALUES (?, ?, ?)",
+                (source, video_id, time.time()),
+            )
+            self._conn.commit()
+
+    def add_many(self, source, video_ids):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO archived (source, video_id, archived_at) VALUES (?, ?, ?)",
+                ((source, video_id, now) for video_id in video_ids),
+            )
+            self._conn.commit()
+
+    def count(self, source):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM archived WHERE source = ?", (source,)).fetchone()[0]
+
+
+class SyncResult:
+    def __init__(self, source):
+        self.source = source
+        self.scanned = 0 # Entries enumerated, new and known
+        self.new = 0 # Entries queued (or marked, for a baseline)
+        self.stopped_early = False
+
+    def to_dict(self):
+        return {"source": self.source, "scanned": self.scanned, "new": self.new, "stopped_early": self.stopped_early}
+
+
+class ChannelSync:
+    """
+    Downloads only what a channel or playlist gained since the last sync.
+
+    Entries are checked against the ArchiveIndex as they are enumerated.
+    Channel tabs list newest first (see utils.urls.lists_newest_first), so
+    a tab stops once stop_after_known archived entries have been seen in a
+    row there (a few, not one, so a pinned or re-ordered video doesn't end
+    the scan early) and the walk moves on to the next tab: a sync costs
+    pages in proportion to new uploads, not to the size of the channel.
+    Playlists can gain entries anywhere and are always scanned in full.
+    An ID is archived only once its download finished; failed ones are
+    picked up again next time.
+
+    list_entries(url, skip=...) lists the entries and defaults to
+    handler.iter_entries (see there for skip); pass a fake to run a sync
+    without network access.
+    """
+    def __init__(self, handler, queue, archive=None, list_entries=None, stop_after_known=3):
+        self.handler = handler
+        self.queue = queue
+        self.archive = archive if archive is not None else ArchiveIndex()
+        self.list_entries = list_entries or handler.iter_entries
+        self.stop_after_known = stop_after_known
+
+    def new_entries(self, url, result):
+        """
+        Yields the entries of url that aren't archived yet, skipping the rest
+        of a newest-first listing at its run of known ones.
+        """
+        skip = set() # Sources whose remaining entries are all archived
+        known_in_a_row = {} # source -> archived entries seen in a row there
+        for entry in self.list_entries(url, skip=skip):
+            result.scanned += 1
+            source = entry.source or url
+            if entry.id and self.archive.contains(result.source, entry.id):
+                if lists_newest_first(source):
+                    known_in_a_row[source] = known_in_a_row.get(source, 0) + 1
+                    if known_in_a_row[source] >= self.stop_after_known:
+                        skip.add(source)
+                        result.stopped_early = True
+                        logger.info(f"Sync of {url} reached archived items in {source} after {result.scanned} entries")
+                continue
+            known_in_a_row[source] = 0
+            result.new += 1
+            yield entry
+
+    def mark_all(self, url):
+        """
+        Archives every current entry without downloading it, so the next sync
+        only fetches uploads from now on. Returns a SyncResult.
+        """
+        result = SyncResult(canonical_key(url))
+        batch = []
+        for entry in self.new_entries(url, result):
+            if entry.id:
+                batch.append(entry.id)
+            if len(batch) >= 500:
+                self.archive.add_many(result.source, batch)
+                batch = []
+        self.archive.add_many(result.source, batch)
+        return result
+
+    def sync(self, url, make_job, on_entry=None):
+        """
+        Queues a job per new entry, built by make_job(entry). Blocks until
+        enumeration is done (not until the downloads are) and returns a SyncResult.
+        """
+        result = SyncResult(canonical_key(url))
+        done = threading.Event()
+        errors = []
+
+        def make_archived_job(entry):
+            job = make_job(entry)
+            if entry.id:
+                job.on_done = lambda job, video_id=entry.id: self._archive_if_finished(result.source, video_id, job)
+            return job
+
+        def on_done(error):
+            if error:
+                errors.append(error)
+            done.set()
+
+        feeder = PlaylistFeeder(self.handler, self.queue, make_archived_job)
+        feeder.start(url, on_entry=on_entry, on_done=on_done, entries=self.new_entries(url, result))
+        done.wait()
+        if errors:
+            raise Exception(f"Sync of {url} failed: {errors[0]}")
+        logger.info(f"Sync of {url}: {result.new} new of {result.scanned} scanned")
+        return result
+
+    def _archive_if_finished(self, source, video_id, job):
+        if job.state == FINISHED:
+            self.archive.add(source, video_id)
@@ -0,0 +1,175 @@
+import hashlib
+import http.client
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin
+from core.cache import cache_key
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+THUMBNAIL_SIZE = (160, 90)
+
+
+def guess_thumbnail_url(url):
+    """
+    For platforms with predictable thumbnail URLs, returns one straight from the
+    video URL so the thumbnail can load while metadata is still being fetched.
+    """
+    key = cache_key(url)
+    if key.startswith("youtube:"):
+        # 320x180, the smallest size that still looks sharp at 160x90
+        return f"https://i.ytimg.com/vi/{key.split(':', 1)[1]}/mqdefault.jpg"
+    return None
+
+
+class ConnectionPool:
+    """
+    Keeps idle HTTP(S) connections per host so repeated thumbnail requests
+    reuse the TCP/TLS session instead of reconnecting each time.
+    """
+    def __init__(self, max_idle_per_host=4, timeout=10):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._idle = {} # (scheme, host, port) -> list of connections
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, host, port):
+        with self._lock:
+            idle = self._idle.get((scheme, host, port))
+            if idle:
+                return idle.pop()
+        return self._connect(scheme, host, port)
+
+    def _connect(self, scheme, host, port):
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _release(self, scheme, host, port, conn):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host, port), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def get(self, url, max_redirects=3):
+        for _ in range(max_redirects + 1):
+            parsed = urlparse(url)
+            scheme = parsed.scheme or "https"
+            port = parsed.port or (443 if scheme == "https" else 80)
+            path = parsed.path or "/"
+            if parsed.query:
+                path += f"?{parsed.query}"
+
+            conn = self._acquire(scheme, parsed.hostname, port)
+            try:
+                conn.request("GET", path, headers={"User-Agent": "Mozilla/5.0"})
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                # Stale keep-alive connection; retry once on a fresh one
+                conn.close()
+                conn = self._connect(scheme, parsed.hostname, port)
+                conn.request("GET", path, headers={"User-Agent": "Mozilla/5.0"})
+                response = conn.getresponse()
+                body = response.read()
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(scheme, parsed.hostname, port, conn)
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status} for {url}")
+            return body
+        raise Exception(f"Too many redirects for {url}")
+
+
+class ThumbnailLoader:
+    """
+    Downloads, decodes and resizes thumbnails off the UI thread. Resized
+    images are cached in memory (LRU) and on disk, keyed by video.
+    """
+    def __init__(self, cache_dir=os.path.join("cache", "thumbnails"), max_workers=4, memory_entries=64, disk_entries=500):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.pool = ConnectionPool()
+        self._memory = OrderedDict() # key -> PIL image
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def load(self, key, url, callback):
+        """
+        Calls callback(key, image) from a worker thread; image is None on failure.
+        """
+        self._executor.submit(self._load, key, url, callback)
+
+    def _load(self, key, url, callback):
+        try:
+            image = self._get(key, url)
+        except Exception as e:
+            logger.warning(f"Thumbnail error: {e}")
+            image = None
+        callback(key, image)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+    def _get(self, key, url):
+        from PIL import Image
+
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                return image
+
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            image = Image.open(path)
+            image.load()
+            os.utime(path) # Keep recently used files from being evicted
+        else:
+            image = self._decode(self.pool.get(url))
+            image.save(path, "JPEG", quality=90)
+            self._evict_disk()
+
+        with self._lock:
+            self._memory[key] = image
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+        return image
+
+    @staticmethod
+    def _decode(raw_data):
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(raw_data))
+        # For JPEGs, let the decoder downscale by 1/2, 1/4 or 1/8 while decoding
+        # instead of decoding the full image and throwing most of it away.
+        image.draft("RGB", THUMBNAIL_SIZE)
+        image = image.convert("RGB")
+        return image.resize(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+
+    def _evict_disk(self):
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+        overflow = len(files) - self.disk_entries
+        if overflow > 0:
+            files.sort(key=os.path.getmtime)
+            for path in files[:overflow]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,54 @@
+import shutil
+
+
+class DownloadTuning:
+    """
+    Settings for the high-throughput download mode.
+
+    DASH/HLS streams are already split into fragments, so yt-dlp can fetch
+    several of them at once (fragment_concurrency). Progressive (single file)
+    streams are split into byte ranges instead. When aria2c is installed it
+    downloads those over several connections; otherwise yt-dlp falls back to
+    sequential chunked range requests of chunk_size bytes.
+
+    Throttling is handled by backing off exponentially between retries and by
+    re-extracting once speed drops below throttled_rate (YouTube sometimes
+    hands out URLs that are throttled to a crawl).
+    """
+    def __init__(self, fragment_concurrency=4, connections=8, chunk_size=10 * 1024 * 1024,
+                 throttled_rate=100 * 1024, retries=10, max_retry_sleep=30, use_aria2c=True):
+        self.fragment_concurrency = fragment_concurrency
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.throttled_rate = throttled_rate
+        self.retries = retries
+        self.max_retry_sleep = max_retry_sleep
+        self.use_aria2c = use_aria2c
+
+    def backoff(self, attempt):
+        return min(2 ** attempt, self.max_retry_sleep)
+
+    def ydl_opts(self):
+        opts = {
+            'concurrent_fragment_downloads': self.fragment_concurrency,
+            'http_chunk_size': self.chunk_size,
+            'throttledratelimit': self.throttled_rate,
+            'retries': self.retries,
+            'fragment_retries': self.retries,
+            'retry_sleep_functions': {
+                'http': self.backoff,
+                'fragment': self.backoff,
+            },
+        }
+
+        if self.use_aria2c and shutil.which("aria2c"):
+            min_split = max(self.chunk_size // (1024 * 1024), 1)
+            opts['external_downloader'] = {'http': 'aria2c'}
+            opts['external_downloader_args'] = {'aria2c': [
+                '--max-connection-per-server', str(self.connections),
+                '--split', str(self.connections),
+                '--min-split-size', f"{min_split}M",
+                '--retry-wait', '2',
+                '--max-tries', str(self.retries),
+            ]}
+        return opts
@@ -1,13 +1,19 @@
-from ui.app import App
-from utils.logger import setup_logger
+from utils.logger import configure_logging, setup_logger
 import sys
 
-# Setup logging
+# Setup logging, once for the whole process
+configure_logging()
 logger = setup_logger()
 
 def main():
+    # Any arguments means headless mode; the GUI stack is never imported then.
+    if len(sys.argv) > 1:
+        from ui.cli import run
+        sys.exit(run(sys.argv[1:]))
+
     logger.info("Application starting...")
     try:
+        from ui.app import App
         app = App()
         app.mainloop()
     except Exception as e:
@@ -1,30 +1,71 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import threading
 import os
-import urllib.request
-from PIL import Image, ImageTk
-import io
-from core.downloader import DownloaderHandler
-from utils.validators import validate_url
+import threading
+from core.audio import AUDIO_BITRATES, DEFAULT_AUDIO_BITRATE
+from core.cache import cache_key
+from core.downloader import DownloaderHandler, warm_up
+from core.bandwidth import BandwidthScheduler, BACKGROUND, parse_rate
+from core.journal import JobJournal
+from core.metrics import Tracer
+from core.policy import PolicySet
+from core.playlist import IsPlaylist, PlaylistFeeder, BEST_AUDIO, BEST_VIDEO
+from core.postprocess import PostprocessPool
+from core.formats import stream_menu
+from core.download_queue import DownloadQueue, DownloadJob, QUEUED, ACTIVE, POSTPROCESSING, FINISHED, FAILED, CANCELLED
+from core.engine import EngineThread
+from core.progress import format_speed, format_eta
+from core.thumbnails import ThumbnailLoader, guess_thumbnail_url
+from ui.bulk_window import BulkWindow
+from utils.logger import MAX_LOG_BYTES
+from utils.urls import parse_url, platform_of
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("green")  # Changed to green to match the button in ref
 
+MAX_CONCURRENT_DOWNLOADS = 3
+SPEED_LIMITS = ("No limit", "512K", "1M", "2M", "5M", "10M") # Global cap shared by all downloads
+PROGRESS_REFRESH_MS = 100 # Progress is redrawn at most this often, however fast downloads tick
+SPANS_PATH = os.path.join("logs", "spans.jsonl") # Per-phase timing of every job, one JSON line per phase; rotates like app.log
+
+JOB_STATE_COLORS = {
+    QUEUED: "gray",
+    ACTIVE: "white",
+    POSTPROCESSING: "white",
+    FINISHED: "green",
+    FAILED: "red",
+    CANCELLED: "gray",
+}
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         self.title("Any Video Downloader")
-        self.geometry("850x450")
+        self.geometry("850x650")
         self.resizable(False, False)
 
         # State
         self.handler = DownloaderHandler()
         self.video_info = None
+        self.video_url = None # URL and raw info dict of the last fetch, reused by its download
+        self.video_raw_info = None
+        self.fetch_future = None # Running fetch, cancelled by clicking the button again
+        self.stream_index = {} # Quality menu label -> Stream
         self.download_path = os.path.join(os.path.expanduser("~"), "Downloads")
+        self.high_throughput = True # Fetch fragments/ranges over several connections
+        self.policies = PolicySet() # Per-platform format policies for Quick Download
         self.thumbnail_image = None
+        self.thumbnails = ThumbnailLoader()
+        self.thumb_key = None # Thumbnail currently wanted; late results for other videos are ignored
+        self.thumb_requested = False
+        self.queue = DownloadQueue(self.handler, max_workers=MAX_CONCURRENT_DOWNLOADS, on_update=self._on_job_update, journal=JobJournal(), bandwidth=BandwidthScheduler(), postprocessor=PostprocessPool(), tracer=Tracer(SPANS_PATH, max_bytes=MAX_LOG_BYTES))
+        self.job_rows = {} # job id -> (title label, status label, cancel button)
+        # Fetches and downloads go through the engine; its loop runs on a thread of its own
+        self.engine = EngineThread(handler=self.handler, queue=self.queue)
+        self.closing = False # Set once the window is closing; worker threads stop calling into Tk
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Main Layout
         self.grid_columnconfigure(0, weight=1)
@@ -32,6 +73,13 @@ class App(ctk.CTk):
 
         self._create_widgets()
 
+        # Import yt-dlp in the background once the window has been drawn
+        self.after_idle(warm_up)
+        self.after(PROGRESS_REFRESH_MS, self._poll_progress)
+
+        # Pick up downloads that were interrupted last time
+        self.after_idle(self.queue.restore)
+
     def _create_widgets(self):
         # Main Container (Card-like)
         self.main_container = ctk.CTkFrame(self, corner_radius=15)
@@ -44,6 +92,9 @@ class App(ctk.CTk):
         
         self.title_label = ctk.CTkLabel(self.header_frame, text="YouTube Downloader", font=("Roboto", 16, "bold"), text_color="gray")
         self.title_label.pack(side="left")
+
+        self.bulk_btn = ctk.CTkButton(self.header_frame, text="Bulk", width=70, height=30, command=self.open_bulk_window, fg_color="#333", hover_color="#444")
+        self.bulk_btn.pack(side="right")
         
         # (Optional) Settings Icon placeholder
         # self.settings_btn = ctk.CTkButton(self.header_frame, text="⚙", width=30, height=30, fg_color="transparent", text_color="gray")
@@ -59,6 +110,10 @@ class App(ctk.CTk):
         self.fetch_btn = ctk.CTkButton(self.input_frame, text="Fetch Info", command=self.on_fetch_click, height=40, font=("Roboto", 13, "bold"), fg_color="#333", hover_color="#444")
         self.fetch_btn.pack(side="right")
 
+        # Queues the URL right away; the platform's format policy picks the quality
+        self.quick_btn = ctk.CTkButton(self.input_frame, text="Quick Download", command=self.on_quick_download_click, width=120, height=40, font=("Roboto", 13, "bold"))
+        self.quick_btn.pack(side="right", padx=(0, 10))
+
         # --- Video Info Section ---
         self.info_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
         self.info_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=10)
@@ -85,10 +140,18 @@ class App(ctk.CTk):
 
         self.res_menu = ctk.CTkOptionMenu(self.options_frame, values=[], width=140)
         self.res_menu.pack(side="left", padx=(0, 10))
+
+        # MP3 bitrate, only shown in audio mode
+        self.bitrate_var = ctk.StringVar(value=f"{DEFAULT_AUDIO_BITRATE} kbps")
+        self.bitrate_menu = ctk.CTkOptionMenu(self.options_frame, values=[f"{b} kbps" for b in AUDIO_BITRATES], variable=self.bitrate_var, width=100)
         
         self.path_btn = ctk.CTkButton(self.options_frame, text="Change Folder", width=120, command=self.select_path, fg_color="#333", hover_color="#444")
         self.path_btn.pack(side="left")
 
+        # Applies to running downloads too, from their next chunk
+        self.limit_menu = ctk.CTkOptionMenu(self.options_frame, values=[SPEED_LIMITS[0]] + [f"{l}B/s" for l in SPEED_LIMITS[1:]], command=self.on_limit_change, width=110)
+        self.limit_menu.pack(side="right")
+
         # --- Controls Section ---
         self.download_btn = ctk.CTkButton(self.main_container, text="Download", command=self.on_download_click, height=45, font=("Roboto", 16, "bold"), state="disabled", fg_color="#2E7D32", hover_color="#1B5E20") # Green
         self.download_btn.grid(row=4, column=0, sticky="ew", padx=20, pady=10)
@@ -104,6 +167,16 @@ class App(ctk.CTk):
         self.progress_bar.pack(side="right", fill="x", expand=True, padx=(15, 0))
         self.progress_bar.set(0)
 
+        # --- Queue Section ---
+        self.main_container.grid_rowconfigure(6, weight=1)
+        self.queue_frame = ctk.CTkScrollableFrame(self.main_container, label_text="Downloads", fg_color="#222")
+        self.queue_frame.grid(row=6, column=0, sticky="nsew", padx=20, pady=(0, 15))
+        self.queue_frame.grid_columnconfigure(0, weight=1)
+
+
+    def open_bulk_window(self):
+        window = BulkWindow(self)
+        window.focus()
 
     def select_path(self):
         path = filedialog.askdirectory()
@@ -111,75 +184,160 @@ class App(ctk.CTk):
             self.download_path = path
             # self.path_label.configure(text=f"Save to: {self.download_path}") # Removed explicit label, could add tooltip or log
 
+    def on_limit_change(self, choice):
+        self.queue.bandwidth.set_global_limit(None if choice == SPEED_LIMITS[0] else parse_rate(choice))
+
+    def on_quick_download_click(self):
+        parsed = parse_url(self.url_entry.get())
+        if parsed is None:
+            self.status_label.configure(text="Invalid URL", text_color="red")
+            return
+        url = parsed.canonical_url
+        self.engine.submit(DownloadJob(
+            url,
+            None,
+            self.download_path,
+            audio_bitrate=self.audio_bitrate(),
+            title=url,
+            group=parsed.platform,
+            high_throughput=self.high_throughput,
+            policy=self.policies.for_url(url),
+        ))
+        self.status_label.configure(text="Added to download queue (automatic quality)", text_color="white")
+
     def on_fetch_click(self):
-        url = self.url_entry.get().strip()
-        if not validate_url(url):
+        if self.fetch_future is not None and not self.fetch_future.done():
+            # The button reads "Cancel" while a fetch runs
+            self.fetch_future.cancel()
+            self.fetch_future = None
+            self.fetch_btn.configure(text="Fetch Info")
+            self.status_label.configure(text="Fetch cancelled", text_color="gray")
+            self.video_title_label.configure(text="")
+            self.thumb_label.configure(text="")
+            return
+
+        parsed = parse_url(self.url_entry.get())
+        if parsed is None:
             self.status_label.configure(text="Invalid URL", text_color="red")
             return
+        url = parsed.canonical_url
         
-        self.fetch_btn.configure(state="disabled")
+        self.fetch_btn.configure(text="Cancel")
         self.status_label.configure(text="Fetching video metadata...", text_color="white")
         self.progress_bar.set(0)
         self.video_title_label.configure(text="Loading...")
         self.video_meta_label.configure(text="")
         self.thumb_label.configure(image=None, text="...")
-        
-        # Threading
-        threading.Thread(target=self._fetch_metadata_thread, args=(url,), daemon=True).start()
+        self.thumbnail_image = None
 
-    def _fetch_metadata_thread(self, url):
+        # Start the thumbnail right away when its URL can be derived from the
+        # video URL, so it loads in parallel with the metadata
+        self.thumb_key = cache_key(url)
+        guessed_url = guess_thumbnail_url(url)
+        self.thumb_requested = guessed_url is not None
+        if guessed_url:
+            self.thumbnails.load(self.thumb_key, guessed_url, self._on_thumbnail_loaded)
+        
+        future = self.fetch_future = self.engine.fetch(url)
+        # Done callbacks run on the engine's thread; hop back to Tk
+        future.add_done_callback(lambda f: self.after(0, lambda: self._on_fetch_done(f, url)))
+
+    def _on_fetch_done(self, future, url):
+        if future is not self.fetch_future:
+            return # Cancelled, or superseded by a newer fetch
+        self.fetch_future = None
+        self.fetch_btn.configure(text="Fetch Info")
         try:
-            self.video_info = self.handler.fetch_metadata(url)
-            
-            # Fetch Thumbnail
-            if self.video_info.thumbnail_url:
-                try:
-                    with urllib.request.urlopen(self.video_info.thumbnail_url) as u:
-                        raw_data = u.read()
-                    
-                    image = Image.open(io.BytesIO(raw_data))
-                    # Resize to fit 160x90
-                    image = image.resize((160, 90), Image.Resampling.LANCZOS)
-                    self.thumbnail_image = ImageTk.PhotoImage(image)
-                except Exception as e:
-                    print(f"Thumbnail error: {e}")
-                    self.thumbnail_image = None
-            
-            self.after(0, self._on_fetch_success)
+            self.video_info, self.video_raw_info = future.result()
+            self.video_url = url
+        except IsPlaylist as playlist:
+            self._on_playlist(playlist)
+            return
         except Exception as e:
-            self.after(0, lambda: self._on_fetch_error(str(e)))
+            self._on_fetch_error(str(e))
+            return
+        self._on_fetch_success()
 
     def _on_fetch_success(self):
-        self.fetch_btn.configure(state="normal")
         self.status_label.configure(text="Ready to download", text_color="gray")
         
         # Update Info UI
         self.video_title_label.configure(text=self.video_info.title)
         self.video_meta_label.configure(text=f"{self.video_info.author} • {self.video_info.length}s")
         
-        if self.thumbnail_image:
-            self.thumb_label.configure(image=self.thumbnail_image, text="")
-        else:
-            self.thumb_label.configure(text="No Image")
+        # Metadata never waits for the thumbnail; it shows up whenever it's ready
+        if not self.thumb_requested:
+            if self.video_info.thumbnail_url:
+                self.thumb_requested = True
+                self.thumbnails.load(self.thumb_key, self.video_info.thumbnail_url, self._on_thumbnail_loaded)
+            else:
+                self.thumb_label.configure(text="No Image")
 
         self.download_btn.configure(state="normal")
         self.update_resolution_options()
 
+    def _on_playlist(self, playlist):
+        self.video_title_label.configure(text=playlist.title or playlist.url)
+        self.video_meta_label.configure(text="Playlist / channel")
+        self.thumb_label.configure(text="")
+        self.status_label.configure(text="Ready", text_color="gray")
+        if not messagebox.askyesno("Playlist", f"\"{playlist.title or playlist.url}\" is a playlist or channel.\n\nQueue all of its videos at the best quality?"):
+            return
+
+        is_audio = self.type_var.get() == "Audio (MP3)"
+        audio_bitrate = self.audio_bitrate()
+
+        def make_job(entry):
+            # Metadata is fetched by the download worker when the job starts
+            return DownloadJob(
+                entry.url,
+                BEST_AUDIO if is_audio else BEST_VIDEO,
+                self.download_path,
+                is_audio=is_audio,
+                audio_bitrate=audio_bitrate,
+                title=entry.title or entry.url,
+                group=platform_of(entry.url),
+                high_throughput=self.high_throughput,
+                priority=BACKGROUND,
+            )
+
+        def on_done(error):
+            if error:
+                self.after(0, lambda: self.status_label.configure(text=f"Playlist error: {error}", text_color="red"))
+
+        PlaylistFeeder(self.handler, self.queue, make_job).start(playlist.url, on_done=on_done)
+        self.status_label.configure(text="Queueing playlist...", text_color="white")
+
+    def _on_thumbnail_loaded(self, key, image):
+        # Called from a thumbnail worker thread
+        self.after(0, lambda: self._show_thumbnail(key, image))
+
+    def _show_thumbnail(self, key, image):
+        if key != self.thumb_key:
+            return
+        if image is None:
+            self.thumb_label.configure(text="No Image")
+            return
+
+        from PIL import ImageTk
+        self.thumbnail_image = ImageTk.PhotoImage(image)
+        self.thumb_label.configure(image=self.thumbnail_image, text="")
+
     def _on_fetch_error(self, error_msg):
-        self.fetch_btn.configure(state="normal")
         self.status_label.configure(text=f"Error: {error_msg}", text_color="red")
         self.video_title_label.configure(text="Error")
         messagebox.showerror("Error", error_msg)
 
     def update_resolution_options(self, _=None):
         mode = self.type_var.get()
-        values = []
-        if mode == "Video (MP4)":
-            streams = self.video_info.streams_mp4
-            values = [f"{s['resolution']} ({s['filesize']})" for s in streams]
+        streams = self.video_info.streams_mp4 if mode == "Video (MP4)" else self.video_info.streams_mp3
+        self.stream_index = stream_menu(streams)
+        values = list(self.stream_index)
+
+        if mode == "Audio (MP3)":
+            self.bitrate_menu.pack(side="left", padx=(0, 10), before=self.path_btn)
         else:
-            streams = self.video_info.streams_mp3
-            values = [f"{s['resolution']} ({s['filesize']})" for s in streams]
+            self.bitrate_menu.pack_forget()
         
         if not values:
             values = ["No streams available"]
@@ -190,75 +348,115 @@ class App(ctk.CTk):
         self.res_menu.configure(values=values)
         self.res_menu.set(values[0])
 
+    def audio_bitrate(self):
+        return int(self.bitrate_var.get().split()[0])
+
     def on_download_click(self):
         mode = self.type_var.get()
         selection = self.res_menu.get()
-        
-        selected_stream = None
-        streams = self.video_info.streams_mp4 if mode == "Video (MP4)" else self.video_info.streams_mp3
-        
-        for s in streams:
-            if f"{s['resolution']} ({s['filesize']})" == selection:
-                selected_stream = s
-                break
-        
+        selected_stream = self.stream_index.get(selection)
         if not selected_stream:
             return
 
-        self.download_btn.configure(state="disabled")
-        self.url_entry.configure(state="disabled")
-        self.type_menu.configure(state="disabled")
-        self.res_menu.configure(state="disabled")
-        self.path_btn.configure(state="disabled")
-        self.fetch_btn.configure(state="disabled")
-        
-        self.status_label.configure(text="Initializing download...", text_color="white")
-        self.progress_bar.set(0)
-
         is_audio = (mode == "Audio (MP3)")
-        threading.Thread(target=self._download_thread, args=(selected_stream['itag'], is_audio), daemon=True).start()
-
-    def _download_thread(self, itag, is_audio):
-        try:
-            self.handler.download_stream(
-                itag, 
-                self.download_path, 
-                self._update_progress, 
-                self._download_complete,
-                is_audio=is_audio
-            )
-            self.after(0, self._on_download_success_ui)
-        except Exception as e:
-            self.after(0, lambda: self._on_download_error(str(e)))
-
-    def _update_progress(self, percentage, downloaded, total):
-        self.after(0, lambda: self._update_progress_ui(percentage))
-
-    def _update_progress_ui(self, percentage):
-        self.progress_bar.set(percentage / 100)
-        self.status_label.configure(text=f"Downloading... {percentage:.1f}%")
-
-    def _download_complete(self, file_path):
-        pass
+        job = DownloadJob(
+            self.video_url,
+            selected_stream.itag,
+            self.download_path,
+            is_audio=is_audio,
+            audio_bitrate=self.audio_bitrate(),
+            info=self.video_raw_info,
+            title=f"{self.video_info.title} [{selection}]",
+            group=platform_of(self.video_url),
+            high_throughput=self.high_throughput,
+        )
+        self.engine.submit(job)
+        self.status_label.configure(text="Added to download queue", text_color="white")
+
+    def _on_job_update(self, job):
+        # Called from worker threads. While closing, the main loop is only
+        # waiting for those threads to exit, so nothing is queued on it.
+        if self.closing:
+            return
+        self.after(0, lambda: self._update_job_row(job))
+
+    def _update_job_row(self, job):
+        if job.id not in self.job_rows:
+            row = len(self.job_rows)
+            title_label = ctk.CTkLabel(self.queue_frame, text=job.title, font=("Roboto", 12), anchor="w")
+            title_label.grid(row=row, column=0, sticky="w", padx=(5, 10), pady=2)
+            status_label = ctk.CTkLabel(self.queue_frame, text="", font=("Roboto", 12), width=300, anchor="e")
+            status_label.grid(row=row, column=1, sticky="e", padx=5, pady=2)
+            cancel_btn = ctk.CTkButton(self.queue_frame, text="✕", width=24, height=24, fg_color="#333", hover_color="#444",
+                                       command=lambda job=job: self.engine.cancel(job))
+            cancel_btn.grid(row=row, column=2, padx=(0, 5), pady=2)
+            self.job_rows[job.id] = (title_label, status_label, cancel_btn)
+
+        _, status_label, cancel_btn = self.job_rows[job.id]
+        if job.state in (FINISHED, FAILED, CANCELLED):
+            cancel_btn.grid_remove()
+        if job.state == ACTIVE:
+            text = f"{job.progress:.1f}%"
+        elif job.state == FAILED:
+            text = "Failed"
+        else:
+            text = job.state.capitalize()
+        status_label.configure(text=text, text_color=JOB_STATE_COLORS[job.state])
 
-    def _on_download_success_ui(self):
-        self.status_label.configure(text="Download Completed!", text_color="green")
-        self.progress_bar.set(1)
-        self._reset_ui_state()
-        messagebox.showinfo("Success", "Download Completed!")
+        self._update_queue_status()
 
-    def _on_download_error(self, error_msg):
-        self.status_label.configure(text="Download Failed", text_color="red")
-        self._reset_ui_state()
-        messagebox.showerror("Download Error", error_msg)
+        if job.state == FAILED:
+            messagebox.showerror("Download Error", f"{job.title}\n\n{job.error}")
 
-    def _reset_ui_state(self):
-        self.download_btn.configure(state="normal")
-        self.url_entry.configure(state="normal")
-        self.type_menu.configure(state="normal")
-        self.res_menu.configure(state="normal")
-        self.path_btn.configure(state="normal")
-        self.fetch_btn.configure(state="normal")
+    def on_close(self):
+        # Stop running downloads at their next chunk instead of killing threads
+        # mid-write; they are journaled and resume on the next start. The
+        # engine is closed off the main thread so the window stays responsive.
+        if self.closing:
+            return
+        self.closing = True
+        if self.fetch_future:
+            self.fetch_future.cancel()
+        self.status_label.configure(text="Stopping downloads...", text_color="white")
+        closer = threading.Thread(target=self.engine.close, kwargs={"interrupt": True, "timeout": 10}, name="engine-close", daemon=True)
+        closer.start()
+        self._wait_for_close(closer)
+
+    def _wait_for_close(self, closer):
+        if closer.is_alive():
+            self.after(100, self._wait_for_close, closer)
+        else:
+            self.destroy()
+
+    def _poll_progress(self):
+        snapshots = self.queue.progress.drain()
+        for snap in snapshots:
+            row = self.job_rows.get(snap.key)
+            if row:
+                text = f"{snap.percent:.1f}%  {format_speed(snap.speed)}  {format_eta(snap.eta)}"
+                allocation = self.queue.bandwidth.allocation(snap.key)
+                if allocation and allocation.rate is not None:
+                    # Measured against the job's share of the cap
+                    text += f"  ({format_speed(allocation.throughput)} of {format_speed(allocation.rate)})"
+                row[1].configure(text=text)
+        if snapshots:
+            self._update_queue_status()
+        self.after(PROGRESS_REFRESH_MS, self._poll_progress)
+
+    def _update_queue_status(self):
+        jobs = self.queue.snapshot()
+        active = [j for j in jobs if j.state == ACTIVE]
+        queued = sum(1 for j in jobs if j.state == QUEUED)
+        processing = sum(1 for j in jobs if j.state == POSTPROCESSING)
+
+        if active:
+            self.progress_bar.set(sum(j.progress for j in active) / len(active) / 100)
+            self.status_label.configure(text=f"Downloading {len(active)} ({queued} queued)", text_color="white")
+        elif processing:
+            self.status_label.configure(text=f"Merging/converting {processing}", text_color="white")
+        elif queued == 0 and jobs:
+            self.progress_bar.set(1)
+            self.status_label.configure(text="All downloads finished", text_color="green")
 
 if __name__ == "__main__":
     app = App()
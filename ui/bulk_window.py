@@ -0,0 +1,128 @@
+import customtkinter as ctk
+from tkinter import filedialog
+from core.bulk import BulkResolver, parse_url_list, load_url_file
+from core.bandwidth import BACKGROUND
+from core.download_queue import DownloadJob
+from utils.urls import platform_of
+
+MAX_PARALLEL_FETCHES = 8
+
+
+class BulkWindow(ctk.CTkToplevel):
+    """
+    Paste or load many URLs, resolve them in parallel and queue them all at
+    the best available quality.
+    """
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Bulk Download")
+        self.geometry("700x550")
+
+        self.resolver = BulkResolver(app.handler, max_workers=MAX_PARALLEL_FETCHES)
+        self.resolved = [] # (url, VideoInfo, raw info)
+        self.pending = 0
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(3, weight=1)
+
+        self.url_text = ctk.CTkTextbox(self, height=140, font=("Roboto", 12))
+        self.url_text.grid(row=0, column=0, sticky="ew", padx=20, pady=(20, 10))
+
+        self.controls_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.controls_frame.grid(row=1, column=0, sticky="ew", padx=20)
+
+        self.load_btn = ctk.CTkButton(self.controls_frame, text="Load File", width=100, command=self.on_load_click, fg_color="#333", hover_color="#444")
+        self.load_btn.pack(side="left", padx=(0, 10))
+
+        self.resolve_btn = ctk.CTkButton(self.controls_frame, text="Fetch All", width=100, command=self.on_resolve_click, fg_color="#333", hover_color="#444")
+        self.resolve_btn.pack(side="left", padx=(0, 10))
+
+        self.type_var = ctk.StringVar(value="Video (MP4)")
+        self.type_menu = ctk.CTkOptionMenu(self.controls_frame, values=["Video (MP4)", "Audio (MP3)"], variable=self.type_var, width=140)
+        self.type_menu.pack(side="left", padx=(0, 10))
+
+        self.queue_btn = ctk.CTkButton(self.controls_frame, text="Queue All", width=100, command=self.on_queue_click, state="disabled", fg_color="#2E7D32", hover_color="#1B5E20")
+        self.queue_btn.pack(side="right")
+
+        self.status_label = ctk.CTkLabel(self, text="Paste URLs (one per line) or load a .txt/.csv file", font=("Roboto", 11), text_color="gray", anchor="w")
+        self.status_label.grid(row=2, column=0, sticky="ew", padx=20, pady=5)
+
+        self.results_frame = ctk.CTkScrollableFrame(self, fg_color="#222")
+        self.results_frame.grid(row=3, column=0, sticky="nsew", padx=20, pady=(0, 20))
+        self.results_frame.grid_columnconfigure(0, weight=1)
+
+    def on_load_click(self):
+        path = filedialog.askopenfilename(filetypes=[("URL lists", "*.txt *.csv"), ("All files", "*.*")])
+        if path:
+            urls = load_url_file(path)
+            self.url_text.insert("end", "\n".join(urls) + "\n")
+
+    def on_resolve_click(self):
+        urls = parse_url_list(self.url_text.get("1.0", "end"))
+        if not urls:
+            self.status_label.configure(text="No supported URLs found", text_color="red")
+            return
+
+        for child in self.results_frame.winfo_children():
+            child.destroy()
+        self.resolved = []
+        self.pending = len(urls)
+
+        self.resolve_btn.configure(state="disabled")
+        self.queue_btn.configure(state="disabled")
+        self.status_label.configure(text=f"Fetching {len(urls)} videos...", text_color="white")
+
+        self.resolver.resolve_all(
+            urls,
+            lambda *result: self.after(0, lambda: self._on_result(*result)),
+            on_done=lambda: self.after(0, self._on_done),
+        )
+
+    def _on_result(self, url, video_info, info, error):
+        self.pending -= 1
+        row = len(self.results_frame.winfo_children()) // 2
+
+        if error:
+            text, status, color = url, "Error", "red"
+        else:
+            self.resolved.append((url, video_info, info))
+            text, status, color = video_info.title, "Ready", "green"
+
+        ctk.CTkLabel(self.results_frame, text=text, font=("Roboto", 12), anchor="w").grid(row=row, column=0, sticky="w", padx=(5, 10), pady=2)
+        ctk.CTkLabel(self.results_frame, text=status, font=("Roboto", 12), text_color=color).grid(row=row, column=1, sticky="e", padx=5, pady=2)
+
+        self.status_label.configure(text=f"{len(self.resolved)} ready, {self.pending} remaining", text_color="white")
+        if self.resolved:
+            self.queue_btn.configure(state="normal")
+
+    def _on_done(self):
+        self.resolve_btn.configure(state="normal")
+        self.status_label.configure(text=f"{len(self.resolved)} videos ready to queue", text_color="gray")
+
+    def on_queue_click(self):
+        is_audio = self.type_var.get() == "Audio (MP3)"
+        queued = 0
+        for url, video_info, info in self.resolved:
+            streams = video_info.streams_mp3 if is_audio else video_info.streams_mp4
+            if not streams:
+                continue
+            # Streams are sorted ascending, so the last one is the best
+            best = streams[-1]
+            self.app.engine.submit(DownloadJob(
+                url,
+                best.itag,
+                self.app.download_path,
+                is_audio=is_audio,
+                audio_bitrate=self.app.audio_bitrate(),
+                info=info,
+                title=f"{video_info.title} [{best.resolution}]",
+                group=platform_of(url),
+                high_throughput=self.app.high_throughput,
+                priority=BACKGROUND,
+            ))
+            queued += 1
+
+        self.resolved = []
+        self.queue_btn.configure(state="disabled")
+        self.status_label.configure(text=f"Queued {queued} downloads", text_color="green")
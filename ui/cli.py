@@ -0,0 +1,468 @@
+"""
+Headless command line interface. Drives DownloaderHandler directly and
+writes one JSON object per line to stdout. Nothing in here may import
+the GUI stack (customtkinter, tkinter, PIL).
+
+    python main.py fetch URL [URL ...]
+    python main.py download URL [--format ID | --policy SPEC] [--audio [--bitrate KBPS]] [--fast] [-o DIR]
+    python main.py batch FILE [--audio [--bitrate KBPS]] [--policy SPEC] [--fast] [-o DIR] [--workers N]
+    python main.py playlist URL [--audio] [--limit N] [--fast] [-o DIR] [--workers N]
+    python main.py sync URL [URL ...] [--baseline] [--audio] [-o DIR] [--workers N]
+    python main.py resume [--workers N]
+    python main.py serve [--host HOST] [--port PORT] [-o DIR] [--workers N] [--token SECRET]
+
+Global options (before the command) turn on per-phase timing of every job:
+--spans adds a "span" line per finished phase, --spans-file appends them
+to a JSON lines file, --metrics-file writes Prometheus text at exit and
+--metrics-port serves it at http://127.0.0.1:PORT/metrics while running.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+from core.audio import AUDIO_BITRATES, AUDIO_TARGETS, DEFAULT_AUDIO_BITRATE, DEFAULT_AUDIO_FORMAT
+from core.bandwidth import parse_rate
+from core.progress import ProgressAggregator
+from utils.urls import platform_of
+from utils.validators import validate_url
+
+PROGRESS_FPS = 2 # JSON progress lines per second, per job
+KEEP_FINISHED = 50 # Completed jobs a playlist/sync run keeps; their results are already out
+
+_emit_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    line = json.dumps({"event": event, **fields}, ensure_ascii=False)
+    with _emit_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def _emit_metadata(url, video_info):
+    emit("metadata", url=url, **video_info.describe())
+
+
+def _bandwidth_of(bandwidth, key):
+    # Cap and measured speed of a running job, for its progress lines
+    allocation = bandwidth.allocation(key)
+    return allocation and allocation.to_dict()
+
+
+def _pick_format(video_info, format_id, is_audio):
+    streams = video_info.streams_mp3 if is_audio else video_info.streams_mp4
+    if not streams:
+        return None
+    if format_id in (None, "best"):
+        # Streams are sorted ascending, so the last one is the best
+        return streams[-1].itag
+    return format_id
+
+
+def cmd_fetch(handler, args):
+    failed = False
+    for url in args.urls:
+        if not validate_url(url):
+            emit("error", url=url, error="Invalid URL")
+            failed = True
+            continue
+        try:
+            _emit_metadata(url, handler.fetch_metadata(url))
+        except Exception as e:
+            emit("error", url=url, error=str(e))
+            failed = True
+    return 1 if failed else 0
+
+
+def cmd_download(handler, args):
+    url = args.url
+    if not validate_url(url):
+        emit("error", url=url, error="Invalid URL")
+        return 1
+
+    try:
+        policy = args.policies.for_url(url) if args.policies else None
+        if policy:
+            # The policy picks the format from the download's own extraction
+            format_id = None
+        else:
+            video_info = handler.fetch_metadata(url)
+            _emit_metadata(url, video_info)
+
+            format_id = _pick_format(video_info, args.format, args.audio)
+            if not format_id:
+                emit("error", url=url, error="No streams available")
+                return 1
+
+        from core.bandwidth import BandwidthScheduler
+        from core.engine import Engine
+        from core.journal import JobJournal
+
+        progress = ProgressAggregator(fps=PROGRESS_FPS)
+        bandwidth = BandwidthScheduler(args.limit_rate)
+
+        def on_frame(snapshots):
+            for snap in snapshots:
+                emit("progress", url=url, **snap.to_dict(), bandwidth=_bandwidth_of(bandwidth, snap.key))
+
+        progress.subscribe(on_frame)
+        progress.start()
+
+        async def download():
+            # A one-worker engine: Ctrl+C cancels the awaiting task, and closing
+            # the engine stops the download at its next progress update. It
+            # stays journaled with its partial files, for `resume`.
+            engine = Engine(handler, max_workers=1, progress=progress, journal=JobJournal(),
+                            bandwidth=bandwidth, tracer=args.tracer)
+            try:
+                return await engine.download(
+                    url,
+                    format_id,
+                    args.output,
+                    is_audio=args.audio,
+                    info=handler.info, # From fetch_metadata; None with a policy
+                    high_throughput=args.fast,
+                    audio_format=args.audio_format,
+                    audio_bitrate=args.bitrate,
+                    policy=policy,
+                )
+            finally:
+                await engine.close(interrupt=True)
+
+        try:
+            filename = asyncio.run(download())
+        finally:
+            progress.stop()
+        emit("result", url=url, status="finished", format_id=format_id, policy=policy and str(policy), filename=filename)
+        return 0
+    except Exception as e:
+        emit("result", url=url, status="failed", error=str(e))
+        return 1
+
+
+def _run_queue(handler, args, keep_finished=None):
+    """
+    Starts a download queue that emits a result line per completed job.
+    Returns (queue, progress, failed), failed being the ids of failed jobs:
+    with keep_finished the queue itself forgets them.
+    """
+    from core.bandwidth import BandwidthScheduler
+    from core.download_queue import DownloadQueue, FAILED
+    from core.journal import JobJournal
+    from core.postprocess import PostprocessPool
+
+    failed = []
+
+    def on_update(job):
+        _emit_job_result(job)
+        if job.state == FAILED:
+            failed.append(job.id)
+
+    progress = ProgressAggregator(fps=PROGRESS_FPS)
+    bandwidth = BandwidthScheduler(args.limit_rate)
+    queue = DownloadQueue(handler, max_workers=args.workers, on_update=on_update, progress=progress,
+                          journal=JobJournal(), bandwidth=bandwidth,
+                          postprocessor=PostprocessPool(args.postprocess_workers), tracer=args.tracer,
+                          keep_finished=keep_finished)
+    args.queue = queue # For run() to interrupt on Ctrl+C
+
+    def on_frame(snapshots):
+        for snap in snapshots:
+            job = queue.jobs.get(snap.key)
+            emit("progress", job=snap.key, url=job and job.url, **snap.to_dict(), bandwidth=_bandwidth_of(bandwidth, snap.key))
+
+    progress.subscribe(on_frame)
+    progress.start()
+    return queue, progress, failed
+
+
+def _emit_job_result(job):
+    from core.download_queue import FINISHED, FAILED
+
+    if job.state == FINISHED:
+        emit("result", job=job.id, url=job.url, status="finished", format_id=job.format_id, filename=job.filename)
+    elif job.state == FAILED:
+        emit("result", job=job.id, url=job.url, status="failed", error=job.error)
+
+
+def _emit_stage_stats(queue):
+    # Utilization of download vs. postprocessing workers, for sizing --workers/--postprocess-workers
+    for stage in queue.stats():
+        emit("stage", **stage)
+
+
+def cmd_resume(handler, args):
+    queue, progress, failed = _run_queue(handler, args)
+    jobs = queue.restore()
+    emit("resume", count=len(jobs))
+    queue.join()
+    _emit_stage_stats(queue)
+    queue.shutdown()
+    progress.stop()
+    return 1 if failed else 0
+
+
+def cmd_batch(handler, args):
+    from core.bulk import BulkResolver, load_url_file
+    from core.bandwidth import BACKGROUND
+    from core.download_queue import DownloadJob
+
+    try:
+        urls = load_url_file(args.file)
+    except (OSError, ValueError) as e:
+        emit("error", file=args.file, error=f"Can't read URL file: {e}")
+        return 1
+    emit("batch", file=args.file, count=len(urls))
+
+    queue, progress, failed = _run_queue(handler, args)
+    resolved = threading.Event()
+    failures = []
+
+    def on_result(url, video_info, info, error):
+        if error:
+            failures.append(url)
+            emit("error", url=url, error=error)
+            return
+        _emit_metadata(url, video_info)
+        format_id = _pick_format(video_info, None, args.audio)
+        if not format_id:
+            failures.append(url)
+            emit("error", url=url, error="No streams available")
+            return
+        queue.submit(DownloadJob(
+            url,
+            format_id,
+            args.output,
+            is_audio=args.audio,
+            audio_format=args.audio_format,
+            audio_bitrate=args.bitrate,
+            info=info,
+            title=video_info.title,
+            group=platform_of(url),
+            high_throughput=args.fast,
+            priority=BACKGROUND,
+        ))
+
+    if args.policies:
+        # Straight to the queue: each worker extracts once and the policy picks the format
+        for url in urls:
+            queue.submit(DownloadJob(
+                url,
+                None,
+                args.output,
+                audio_format=args.audio_format,
+                audio_bitrate=args.bitrate,
+                group=platform_of(url),
+                high_throughput=args.fast,
+                priority=BACKGROUND,
+                policy=args.policies.for_url(url),
+            ))
+    else:
+        BulkResolver(handler, max_workers=args.fetch_workers).resolve_all(urls, on_result, on_done=resolved.set)
+        resolved.wait()
+    queue.join()
+    _emit_stage_stats(queue)
+    queue.shutdown()
+    progress.stop()
+
+    return 1 if failures or failed else 0
+
+
+def _entry_job(args, entry):
+    # Job for a playlist/channel entry. No metadata fetch here; each video is
+    # extracted when a worker picks it up
+    from core.bandwidth import BACKGROUND
+    from core.download_queue import DownloadJob
+    from core.playlist import BEST_AUDIO, BEST_VIDEO
+
+    return DownloadJob(
+        entry.url,
+        BEST_AUDIO if args.audio else BEST_VIDEO,
+        args.output,
+        is_audio=args.audio,
+        audio_format=args.audio_format,
+        audio_bitrate=args.bitrate,
+        title=entry.title or entry.url,
+        group=platform_of(entry.url),
+        high_throughput=args.fast,
+        priority=BACKGROUND,
+        policy=args.policies.for_url(entry.url) if args.policies else None,
+    )
+
+
+def _emit_entry(entry, job):
+    emit("entry", job=job.id, **entry.to_dict())
+
+
+def cmd_playlist(handler, args):
+    from core.playlist import PlaylistFeeder
+
+    queue, progress, failed = _run_queue(handler, args, keep_finished=KEEP_FINISHED)
+    enumerated = threading.Event()
+    errors = []
+
+    def on_done(error):
+        if error:
+            errors.append(error)
+            emit("error", url=args.url, error=error)
+        enumerated.set()
+
+    PlaylistFeeder(handler, queue, lambda entry: _entry_job(args, entry)).start(args.url, limit=args.limit, on_entry=_emit_entry, on_done=on_done)
+    enumerated.wait()
+    queue.join()
+    _emit_stage_stats(queue)
+    queue.shutdown()
+    progress.stop()
+
+    return 1 if errors or failed else 0
+
+
+def cmd_sync(handler, args):
+    from core.sync import ArchiveIndex, ChannelSync
+
+    queue, progress, failed = _run_queue(handler, args, keep_finished=KEEP_FINISHED)
+    sync = ChannelSync(handler, queue, ArchiveIndex(), stop_after_known=args.stop_after_known)
+    errors = False
+
+    for url in args.urls:
+        try:
+            if args.baseline:
+                result = sync.mark_all(url)
+            else:
+                result = sync.sync(url, lambda entry: _entry_job(args, entry), _emit_entry)
+            emit("sync", url=url, baseline=args.baseline, **result.to_dict())
+        except Exception as e:
+            emit("error", url=url, error=str(e))
+            errors = True
+
+    queue.join()
+    _emit_stage_stats(queue)
+    queue.shutdown()
+    progress.stop()
+
+    return 1 if errors or failed else 0
+
+
+def cmd_serve(handler, args):
+    from core.journal import JobJournal
+    from ui.server import DownloadService, make_server
+
+    service = DownloadService(handler, args.output, workers=args.workers, postprocess_workers=args.postprocess_workers,
+                              limit_rate=args.limit_rate, tracer=args.tracer, journal=JobJournal())
+    try:
+        server = make_server(service, args.host, args.port, args.token)
+    except OSError as e:
+        service.close()
+        emit("error", error=f"Can't listen on {args.host}:{args.port}: {e}")
+        return 1
+    service.start()
+    emit("serving", url=f"http://{args.host}:{server.server_port}/api")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+def _rate(text):
+    try:
+        return parse_rate(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate '{text}', expected e.g. 500K or 2M")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="Universal Downloader (headless mode)")
+    parser.add_argument("--spans", action="store_true", help="Emit a 'span' event per finished job phase")
+    parser.add_argument("--spans-file", help="Append job phase spans to this JSON lines file")
+    parser.add_argument("--metrics-file", help="Write per-phase metrics in Prometheus text format here at exit")
+    parser.add_argument("--metrics-port", type=int, help="Serve per-phase metrics at http://127.0.0.1:PORT/metrics")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    # Options shared by the commands that download
+    output_options = argparse.ArgumentParser(add_help=False)
+    output_options.add_argument("--audio", action="store_true", help="Download audio only")
+    output_options.add_argument("--audio-format", choices=sorted(AUDIO_TARGETS), default=DEFAULT_AUDIO_FORMAT, help="Audio output format (default mp3)")
+    output_options.add_argument("--bitrate", type=int, choices=AUDIO_BITRATES, default=DEFAULT_AUDIO_BITRATE, help="Audio bitrate in kbps (default 192)")
+    output_options.add_argument("-o", "--output", default=os.getcwd(), help="Output directory")
+    output_options.add_argument("--fast", action="store_true", help="Use several connections per stream")
+    output_options.add_argument("--policy", action="append", help="Pick formats by policy instead: 'auto' (per-platform defaults), SPEC or PLATFORM=SPEC; repeatable")
+
+    # ...and by the ones that run a download queue
+    queue_options = argparse.ArgumentParser(add_help=False)
+    queue_options.add_argument("--workers", type=int, default=3, help="Concurrent downloads")
+    queue_options.add_argument("--postprocess-workers", type=int, help="Concurrent merges/conversions (default: CPU count)")
+    queue_options.add_argument("--limit-rate", type=_rate, help="Max total download speed, e.g. 500K or 2M")
+
+    fetch = sub.add_parser("fetch", help="Print metadata and available formats")
+    fetch.add_argument("urls", nargs="+")
+
+    download = sub.add_parser("download", parents=[output_options], help="Download a single URL")
+    download.add_argument("url")
+    download.add_argument("--format", default="best", help="Format ID from `fetch`, or 'best' (default)")
+    download.add_argument("--limit-rate", type=_rate, help="Max download speed, e.g. 500K or 2M")
+
+    batch = sub.add_parser("batch", parents=[output_options, queue_options], help="Download every URL in a .txt/.csv file at best quality")
+    batch.add_argument("file")
+    batch.add_argument("--fetch-workers", type=int, default=8, help="Concurrent metadata fetches")
+
+    playlist = sub.add_parser("playlist", parents=[output_options, queue_options], help="Download every video of a playlist or channel, best quality")
+    playlist.add_argument("url")
+    playlist.add_argument("--limit", type=int, help="Stop after this many entries")
+
+    sync = sub.add_parser("sync", parents=[output_options, queue_options], help="Download only what channels/playlists gained since the last sync")
+    sync.add_argument("urls", nargs="+")
+    sync.add_argument("--baseline", action="store_true", help="Mark everything there now as archived without downloading")
+    sync.add_argument("--stop-after-known", type=int, default=3, help="Stop a channel tab after this many archived entries in a row (playlists are always scanned in full)")
+
+    sub.add_parser("resume", parents=[queue_options], help="Resume downloads that were interrupted")
+
+    serve = sub.add_parser("serve", parents=[queue_options], help="Serve a local HTTP API sharing one download queue between clients")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8750, help="Port to listen on (default 8750)")
+    serve.add_argument("--token", help="Require this bearer token on every request")
+    serve.add_argument("-o", "--output", default=os.getcwd(), help="Output directory")
+
+    return parser
+
+
+def run(argv):
+    args = build_parser().parse_args(argv)
+
+    from core.downloader import DownloaderHandler
+    handler = DownloaderHandler()
+
+    args.policies = None
+    if getattr(args, "policy", None):
+        from core.policy import PolicySet, PolicyError
+        try:
+            args.policies = PolicySet.parse(args.policy)
+        except PolicyError as e:
+            emit("error", error=f"Invalid policy: {e}")
+            return 2
+
+    args.tracer = None
+    if args.spans or args.spans_file or args.metrics_file or args.metrics_port:
+        from core.metrics import Tracer
+        args.tracer = Tracer(args.spans_file, on_span=(lambda span: emit("span", **span)) if args.spans else None)
+        if args.metrics_port:
+            args.tracer.serve(args.metrics_port)
+
+    commands = {"fetch": cmd_fetch, "download": cmd_download, "batch": cmd_batch, "playlist": cmd_playlist, "sync": cmd_sync, "resume": cmd_resume, "serve": cmd_serve}
+    args.queue = None
+    try:
+        return commands[args.command](handler, args)
+    except KeyboardInterrupt:
+        # Running jobs keep their partial files and stay journaled; `resume` picks them up
+        if args.queue is not None:
+            args.queue.shutdown(interrupt=True, timeout=10)
+        emit("interrupted", command=args.command)
+        return 130
+    finally:
+        if args.tracer:
+            if args.metrics_file:
+                args.tracer.dump(args.metrics_file)
+            args.tracer.close()
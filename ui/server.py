@@ -0,0 +1,416 @@
+"""
+Local HTTP service, for several people sharing one download box. One
+long-running process owns the downloader: yt-dlp is imported once, the
+metadata cache stays open, and the raw info of recent fetches is kept in
+memory, so a job submitted after a fetch starts downloading without
+extracting the video again. Every client shares one queue and worker pool.
+
+    python main.py serve [--host 127.0.0.1] [--port 8750] [-o DIR] [--workers N] [--token SECRET]
+
+Endpoints (JSON in and out):
+
+    GET    /api/fetch?url=URL   metadata and formats, as the CLI's "metadata" event
+    POST   /api/jobs            {"url", "format" | "policy", "audio", "audio_format", "bitrate", "fast",
+                                 "priority": "interactive" | "background", "weight": up to MAX_WEIGHT}
+    GET    /api/jobs            jobs of this run in submission order (the last
+                                KEEP_FINISHED completed ones, plus all pending)
+    GET    /api/jobs/ID         one job; a running one has its bandwidth cap and
+                                measured speed under "bandwidth"
+    DELETE /api/jobs/ID         cancel it (?keep=1 keeps the partial files)
+    GET    /api/events          Server-Sent Events: "job" on every state change,
+                                "progress" frames while downloads run
+    GET    /metrics             Prometheus text, with --spans/--metrics-* turned on
+
+With --token every request needs 'Authorization: Bearer SECRET' (or
+?token=SECRET, for EventSource clients that can't set headers).
+
+Each client's jobs form their own group in the queue, which takes from the
+groups in turn, so one client submitting hundreds of URLs doesn't hold up
+everyone else. Clients are told apart by address, or by an 'X-Client'
+header where several share one (a proxy, or one box).
+"""
+import hmac
+import json
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from core.audio import AUDIO_BITRATES, AUDIO_TARGETS, DEFAULT_AUDIO_BITRATE, DEFAULT_AUDIO_FORMAT
+from core.progress import ProgressAggregator
+from utils.logger import setup_logger
+from utils.urls import canonical_url
+from utils.validators import validate_url
+
+logger = setup_logger()
+
+DEFAULT_PORT = 8750
+PROGRESS_FPS = 2 # Progress frames per second sent to event clients
+FETCH_TIMEOUT = 120 # seconds
+MAX_BODY = 64 * 1024
+INFO_CACHE_SIZE = 64 # Raw info dicts kept from fetches; each can be a few hundred KB
+KEEPALIVE = 15 # seconds between comments on an idle event stream
+KEEP_FINISHED = 200 # Completed jobs still listed; older ones are forgotten
+MAX_WEIGHT = 10 # Largest bandwidth weight a client may give its job
+
+
+class RequestError(Exception):
+    """
+    A request the service refuses, answered with status and the message.
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class EventHub:
+    """
+    Fans events out to the connected event streams. Each client gets a
+    bounded queue; one that falls behind is disconnected rather than let
+    grow, and gets the full job list again when it reconnects.
+    """
+    def __init__(self, backlog=256):
+        self.backlog = backlog
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        client = queue.Queue(self.backlog)
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def publish(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+        with self._lock:
+            for client in list(self._clients):
+                try:
+                    client.put_nowait(message)
+                except queue.Full:
+                    logger.warning("Dropping an event client that fell behind")
+                    self._clients.remove(client)
+                    self._close(client)
+
+    def close(self):
+        with self._lock:
+            for client in self._clients:
+                self._close(client)
+            self._clients.clear()
+
+    @staticmethod
+    def _close(client):
+        # None tells the stream to end; make room for it if the queue is full
+        while True:
+            try:
+                client.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+def job_dict(job, bandwidth=None):
+    # bandwidth: the BandwidthScheduler, for a running job's cap and measured speed
+    allocation = bandwidth and bandwidth.allocation(job.id)
+    return {
+        "id": job.id,
+        "url": job.url,
+        "title": job.title,
+        "state": job.state,
+        "progress": round(job.progress, 1),
+        "downloaded": job.downloaded,
+        "total": job.total,
+        "format_id": job.format_id,
+        "audio": job.is_audio,
+        "policy": job.policy and str(job.policy),
+        "filename": job.filename,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "priority": job.priority,
+        "weight": job.weight,
+        "bandwidth": allocation and allocation.to_dict(),
+    }
+
+
+class DownloadService:
+    """
+    What the HTTP API exposes, without the HTTP: fetches and downloads run
+    on an EngineThread over a DownloadQueue shared by every client, and job
+    changes and progress go out through an EventHub. limit_rate is the
+    total download cap in bytes/sec.
+    """
+    def __init__(self, handler, download_path, workers=3, postprocess_workers=None, limit_rate=None, tracer=None, journal=None, keep_finished=KEEP_FINISHED):
+        from core.bandwidth import BandwidthScheduler
+        from core.download_queue import DownloadQueue
+        from core.engine import EngineThread
+        from core.postprocess import PostprocessPool
+
+        self.handler = handler
+        self.download_path = download_path
+        self.tracer = tracer
+        self.events = EventHub()
+        self.progress = ProgressAggregator(fps=PROGRESS_FPS)
+        self.queue = DownloadQueue(handler, max_workers=workers, on_update=self._on_update, progress=self.progress,
+                                   journal=journal, bandwidth=BandwidthScheduler(limit_rate),
+                                   postprocessor=PostprocessPool(postprocess_workers), tracer=tracer,
+                                   keep_finished=keep_finished)
+        self.engine = EngineThread(handler=handler, queue=self.queue)
+        self._infos = OrderedDict() # canonical URL -> raw info dict of a recent fetch
+        self._infos_lock = threading.Lock()
+
+        self.progress.subscribe(self._on_frame)
+        self.progress.start()
+
+    def start(self):
+        """
+        Imports yt-dlp ahead of the first request and re-queues jobs a
+        previous run left unfinished.
+        """
+        from core.downloader import warm_up
+        warm_up()
+        jobs = self.queue.restore()
+        if jobs:
+            logger.info(f"Resumed {len(jobs)} unfinished jobs")
+
+    def describe(self, job):
+        return job_dict(job, self.queue.bandwidth)
+
+    def _on_update(self, job):
+        self.events.publish("job", self.describe(job))
+
+    def _on_frame(self, snapshots):
+        bandwidth = self.queue.bandwidth
+        frames = []
+        for snap in snapshots:
+            allocation = bandwidth.allocation(snap.key)
+            frames.append({"id": snap.key, **snap.to_dict(), "bandwidth": allocation and allocation.to_dict()})
+        self.events.publish("progress", frames)
+
+    def fetch(self, url):
+        if not validate_url(url):
+            raise RequestError("Invalid URL")
+        from core.playlist import IsPlaylist
+        future = self.engine.fetch(url)
+        try:
+            video_info, info = future.result(FETCH_TIMEOUT)
+        except FutureTimeout:
+            future.cancel()
+            raise RequestError("Timed out fetching metadata", 504)
+        except IsPlaylist as e:
+            raise RequestError(f"{e}; submit its videos one by one", 422)
+        except Exception as e:
+            raise RequestError(str(e), 502)
+
+        if info is not None:
+            with self._infos_lock:
+                self._infos[canonical_url(url)] = info
+                self._infos.move_to_end(canonical_url(url))
+                while len(self._infos) > INFO_CACHE_SIZE:
+                    self._infos.popitem(last=False)
+
+        return {"url": url, **video_info.describe()}
+
+    def submit(self, request, client="local"):
+        """
+        Queues a download from a request body for client, whose jobs share a
+        queue group. Without a format or policy the best video (or audio) is
+        picked when the job runs.
+        """
+        from core.bandwidth import INTERACTIVE, PRIORITY_WEIGHTS
+        from core.download_queue import DownloadJob
+        from core.playlist import BEST_AUDIO, BEST_VIDEO
+        from core.policy import PolicyError, PolicySet
+
+        url = request.get("url")
+        if not isinstance(url, str) or not validate_url(url):
+            raise RequestError("Invalid URL")
+        is_audio = bool(request.get("audio", False))
+        audio_format = request.get("audio_format", DEFAULT_AUDIO_FORMAT)
+        if not isinstance(audio_format, str) or audio_format not in AUDIO_TARGETS:
+            raise RequestError(f"audio_format must be one of: {', '.join(sorted(AUDIO_TARGETS))}")
+        bitrate = request.get("bitrate", DEFAULT_AUDIO_BITRATE)
+        if bitrate not in AUDIO_BITRATES:
+            raise RequestError(f"bitrate must be one of: {', '.join(map(str, AUDIO_BITRATES))}")
+
+        priority = request.get("priority", INTERACTIVE)
+        if priority not in PRIORITY_WEIGHTS:
+            raise RequestError(f"priority must be one of: {', '.join(PRIORITY_WEIGHTS)}")
+        weight = request.get("weight", 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0 < weight <= MAX_WEIGHT:
+            raise RequestError(f"weight must be a number above 0 and at most {MAX_WEIGHT}")
+
+        format_id = request.get("format")
+        if format_id is not None and not isinstance(format_id, str):
+            raise RequestError("format must be a string")
+
+        policy = None
+        if request.get("policy"):
+            if not isinstance(request["policy"], str):
+                raise RequestError("policy must be a string")
+            try:
+                policy = PolicySet.parse([request["policy"]]).for_url(url)
+            except PolicyError as e:
+                raise RequestError(f"Invalid policy: {e}")
+        format_id = None if policy else format_id or (BEST_AUDIO if is_audio else BEST_VIDEO)
+
+        with self._infos_lock:
+            info = self._infos.get(canonical_url(url)) # download_stream re-extracts if it has gone stale
+
+        job = DownloadJob(url, format_id, self.download_path, is_audio=is_audio, info=info, title=info and info.get("title"),
+                          group=f"client:{client}", high_throughput=bool(request.get("fast", False)), audio_format=audio_format,
+                          audio_bitrate=bitrate, priority=priority, weight=weight, policy=policy)
+        self.engine.submit(job)
+        return job
+
+    def job(self, job_id):
+        job = self.queue.jobs.get(job_id)
+        if job is None:
+            raise RequestError(f"No job {job_id}", 404)
+        return job
+
+    def jobs(self):
+        return self.queue.snapshot()
+
+    def cancel(self, job_id, discard=True):
+        job = self.job(job_id)
+        self.engine.cancel(job, discard)
+        return job
+
+    def close(self):
+        # Running jobs stop with their partial files kept and stay journaled
+        self.events.close()
+        self.progress.stop()
+        self.engine.close(interrupt=True, timeout=10)
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, token=None):
+    """
+    HTTP server for service. Call serve_forever() to run it; port 0 picks a
+    free port (see server.server_port).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+        def _send_json(self, data, status=200):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _handle(self, method):
+            parsed = urlparse(self.path)
+            params = parse_qs(parsed.query)
+            try:
+                if token is not None and not self._authorized(params):
+                    raise RequestError("Missing or wrong token", 401)
+                self._route(method, parsed.path.rstrip("/"), params)
+            except RequestError as e:
+                self._send_json({"error": str(e)}, e.status)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            except Exception as e:
+                logger.error(f"Service request {method} {self.path} failed: {e}")
+                self._send_json({"error": "Internal error"}, 500)
+
+        def _authorized(self, params):
+            header = self.headers.get("Authorization", "")
+            given = header[len("Bearer "):] if header.startswith("Bearer ") else params.get("token", [""])[0]
+            return hmac.compare_digest(given.encode("utf-8"), token.encode("utf-8"))
+
+        def _route(self, method, path, params):
+            parts = path.split("/")[1:] # "/api/jobs/3" -> ["api", "jobs", "3"]
+            if method == "GET" and path == "/api/fetch":
+                self._send_json(service.fetch(params.get("url", [""])[0]))
+            elif method == "GET" and path == "/api/jobs":
+                self._send_json([service.describe(job) for job in service.jobs()])
+            elif method == "POST" and path == "/api/jobs":
+                self._send_json(service.describe(service.submit(self._read_json(), self._client())), 201)
+            elif len(parts) == 3 and parts[:2] == ["api", "jobs"]:
+                if not parts[2].isdigit():
+                    raise RequestError(f"No job {parts[2]}", 404)
+                job_id = int(parts[2])
+                if method == "GET":
+                    self._send_json(service.describe(service.job(job_id)))
+                elif method == "DELETE":
+                    keep = params.get("keep", ["0"])[0] not in ("", "0", "false")
+                    self._send_json(service.describe(service.cancel(job_id, discard=not keep)))
+                else:
+                    raise RequestError("Method not allowed", 405)
+            elif method == "GET" and path == "/api/events":
+                self._stream_events()
+            elif method == "GET" and path == "/metrics" and service.tracer is not None:
+                body = service.tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                raise RequestError("Not found", 404)
+
+        def _client(self):
+            return self.headers.get("X-Client") or self.client_address[0]
+
+        def _read_json(self):
+            length = self.headers.get("Content-Length") or "0"
+            if not length.isdigit():
+                raise RequestError("Invalid Content-Length")
+            length = int(length)
+            if length > MAX_BODY:
+                raise RequestError("Request body too large", 413)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                raise RequestError("Request body is not valid JSON")
+            if not isinstance(body, dict):
+                raise RequestError("Request body must be a JSON object")
+            return body
+
+        def _stream_events(self):
+            client = service.events.subscribe()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                # Current state first, so a (re)connecting client needs no separate listing
+                for job in service.jobs():
+                    self.wfile.write(f"event: job\ndata: {json.dumps(service.describe(job), ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                while True:
+                    try:
+                        message = client.get(timeout=KEEPALIVE)
+                    except queue.Empty:
+                        message = b": keepalive\n\n"
+                    if message is None:
+                        return
+                    self.wfile.write(message)
+                    self.wfile.flush()
+            finally:
+                service.events.unsubscribe(client)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
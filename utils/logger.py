@@ -1,20 +1,100 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+from datetime import date, datetime
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(module)s - %(message)s"
+LOG_FILENAME = "app.log"
+MAX_LOG_BYTES = 10 * 1024 * 1024 # Roll over at this size...
+BACKUP_COUNT = 14 # ...or at midnight, keeping this many old files (app.log.1 is the newest)
+JSON_ENV = "DOWNLOADER_LOG_JSON" # Set to 1 for one JSON object per log line
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "module": record.module,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DailyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that also rolls over on the first record of a new
+    day, so each file covers at most one day and at most max_bytes.
+    """
+    def __init__(self, filename, max_bytes, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self._day = date.fromtimestamp(os.path.getmtime(filename)) if os.path.exists(filename) else date.today()
+
+    def shouldRollover(self, record):
+        if date.today() != self._day and os.path.exists(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._day = date.today()
+
+
+def configure_logging(log_dir="logs", level=logging.INFO, json_format=None, max_bytes=MAX_LOG_BYTES, backup_count=BACKUP_COUNT):
+    """
+    Sets up logging for the process; call once at startup, before any work.
+
+    Loggers only put records on an in-memory queue. A listener thread does
+    the formatting and the file/console writes, so download workers and
+    progress hooks never wait on disk I/O. The file in log_dir rotates by
+    size and by day and keeps backup_count old files.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
 
-def setup_logger(log_dir="logs"):
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
-    log_filename = datetime.now().strftime("app_%Y-%m-%d.log")
-    log_path = os.path.join(log_dir, log_filename)
-
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(module)s - %(message)s",
-        handlers=[
-            logging.FileHandler(log_path),
-            logging.StreamHandler()
-        ]
-    )
+    if json_format is None:
+        json_format = os.environ.get(JSON_ENV, "") not in ("", "0")
+    formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+
+    file_handler = DailyRotatingFileHandler(os.path.join(log_dir, LOG_FILENAME), max_bytes, backup_count)
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue() # Unbounded: putting a record never blocks
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(records))
+
+    _listener = logging.handlers.QueueListener(records, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """
+    Writes out the records still queued and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logger():
+    # Modules call this at import time. It only hands out the app logger;
+    # where records go is decided once by configure_logging.
     return logging.getLogger("YTDownloader")
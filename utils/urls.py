@@ -0,0 +1,206 @@
+import re
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode
+
+ParsedUrl = namedtuple("ParsedUrl", ["platform", "video_id", "canonical_url"])
+
+# Registrable domain -> platform. A host matches if it is one of these or a
+# subdomain of one (m.youtube.com, vm.tiktok.com, old.reddit.com...).
+PLATFORM_DOMAINS = {
+    "youtube.com": "youtube",
+    "youtu.be": "youtube",
+    "tiktok.com": "tiktok",
+    "instagram.com": "instagram",
+    "twitter.com": "x",
+    "x.com": "x",
+    "reddit.com": "reddit",
+    "linkedin.com": "linkedin",
+    "facebook.com": "facebook",
+    "fb.watch": "facebook",
+}
+
+# Query params that only track where a link was shared from
+TRACKING_PARAMS = frozenset({"si", "s", "feature", "pp", "igsh", "igshid", "ref", "ref_src", "ref_url", "fbclid", "is_from_webapp", "sender_device"})
+
+YOUTUBE_ID_RE = re.compile(r"[A-Za-z0-9_-]{11}")
+
+
+def match_platform(host):
+    """
+    Returns the platform for a lowercase hostname, checking the host and each
+    parent domain against PLATFORM_DOMAINS (one set lookup per label).
+    """
+    while True:
+        platform = PLATFORM_DOMAINS.get(host)
+        if platform is not None:
+            return platform
+        dot = host.find(".")
+        if dot < 0:
+            return None
+        host = host[dot + 1:]
+
+
+def _query_param(query, name):
+    # Cheaper than parse_qsl for pulling one param out of a short query string
+    prefix = name + "="
+    for pair in query.split("&"):
+        if pair.startswith(prefix):
+            return pair[len(prefix):]
+    return None
+
+
+def _youtube_id(host, parts, query):
+    if host == "youtu.be":
+        return parts[0] if parts else None
+    if parts and parts[0] == "watch":
+        return _query_param(query, "v")
+    if len(parts) > 1 and parts[0] in ("shorts", "embed", "live", "v"):
+        return parts[1]
+    return None
+
+
+def _video_id(platform, host, parts, query):
+    video_id = None
+    if platform == "youtube":
+        video_id = _youtube_id(host, parts, query)
+        return video_id if video_id and YOUTUBE_ID_RE.fullmatch(video_id) else None
+    if platform == "x":
+        # /<user>/status/<id>
+        if len(parts) > 2 and parts[1] == "status":
+            video_id = parts[2]
+        return video_id if video_id and video_id.isdigit() else None
+    if platform == "tiktok":
+        # /@<user>/video/<id>
+        if len(parts) > 2 and parts[1] == "video":
+            video_id = parts[2]
+        return video_id if video_id and video_id.isdigit() else None
+    if platform == "instagram":
+        if len(parts) > 1 and parts[0] in ("p", "reel", "reels", "tv"):
+            return parts[1]
+        return None
+    if platform == "reddit":
+        # /r/<sub>/comments/<id>/<slug>
+        if "comments" in parts:
+            index = parts.index("comments")
+            if index + 1 < len(parts):
+                return parts[index + 1]
+        return None
+    if platform == "facebook":
+        if parts and parts[0] == "watch":
+            return _query_param(query, "v")
+        if len(parts) > 1 and parts[-2] in ("videos", "reel"):
+            return parts[-1]
+    return None
+
+
+def parse_url(url):
+    """
+    Parses a media URL once and returns ParsedUrl(platform, video_id, canonical_url),
+    or None if it isn't from a supported platform. video_id is None when the
+    URL doesn't carry one (short links, playlists, profiles...).
+    The canonical URL has tracking params, port and fragment removed and a
+    lowercase host.
+
+    Splits the URL by hand rather than with urlsplit: bulk imports run this
+    on every line, and the full parser is several times slower.
+    """
+    if not url:
+        return None
+    url = url.strip()
+    scheme_end = url.find("://")
+    if scheme_end < 0:
+        rest = url
+    elif url[:scheme_end].lower() in ("http", "https"):
+        rest = url[scheme_end + 3:]
+    else:
+        return None
+
+    rest = rest.split("#", 1)[0]
+    rest, _, query = rest.partition("?")
+    slash = rest.find("/")
+    if slash < 0:
+        authority, path = rest, ""
+    else:
+        authority, path = rest[:slash], rest[slash:]
+
+    host = authority.rpartition("@")[2].partition(":")[0].lower().rstrip(".")
+    if not host:
+        return None
+
+    platform = match_platform(host)
+    if platform is None:
+        return None
+
+    # Extractors can be picky about the host (TikTok needs www.), so the
+    # canonical URL keeps it; only ID matching ignores www./m.
+    bare_host = host
+    if bare_host.startswith("www.") or bare_host.startswith("m."):
+        bare_host = bare_host.split(".", 1)[1]
+    path_parts = [p for p in path.split("/") if p]
+    video_id = _video_id(platform, bare_host, path_parts, query)
+
+    if platform == "youtube" and video_id:
+        canonical = f"https://www.youtube.com/watch?v={video_id}"
+    elif platform == "x" and video_id:
+        canonical = f"https://x.com/i/status/{video_id}"
+    else:
+        canonical = f"https://{host}{path.rstrip('/') or '/'}"
+        if query:
+            kept = [(k, v) for k, v in parse_qsl(query)
+                    if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")]
+            if kept:
+                canonical += f"?{urlencode(kept)}"
+
+    return ParsedUrl(platform, video_id, canonical)
+
+
+def canonical_url(url):
+    """
+    Canonical form of a supported URL; anything else is returned stripped.
+    """
+    parsed = parse_url(url)
+    return parsed.canonical_url if parsed is not None else url.strip()
+
+
+def platform_of(url):
+    """
+    Platform name for grouping and rate limiting, so youtu.be and youtube.com
+    links share one group. Unsupported URLs fall back to 'default'.
+    """
+    parsed = parse_url(url)
+    return parsed.platform if parsed is not None else "default"
+
+
+def lists_newest_first(url):
+    """
+    True for listings known to put the latest upload first: YouTube channel
+    pages and their tabs (/@name/videos, /channel/ID/shorts...) and TikTok
+    profiles. Playlists can be in any order and items get appended at the end.
+    """
+    parsed = parse_url(url)
+    if parsed is None or parsed.video_id:
+        return False
+    parts = [p for p in parsed.canonical_url.split("://", 1)[1].split("?", 1)[0].split("/")[1:] if p]
+    if not parts:
+        return False
+    if parsed.platform == "youtube":
+        return parts[0].startswith("@") or (parts[0] in ("channel", "c", "user") and len(parts) > 1)
+    if parsed.platform == "tiktok":
+        return parts[0].startswith("@") and len(parts) == 1
+    return False
+
+
+def canonical_key(url):
+    """
+    Stable key for caches and indexes: '<platform>:<id>' when the URL has a
+    video ID, otherwise the canonical URL without its scheme or www./m. prefix.
+    """
+    parsed = parse_url(url)
+    if parsed is None:
+        return url.strip()
+    if parsed.video_id:
+        return f"{parsed.platform}:{parsed.video_id}"
+    key = parsed.canonical_url.split("://", 1)[1]
+    if key.startswith("www.") or key.startswith("m."):
+        key = key.split(".", 1)[1]
+    return key
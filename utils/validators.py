@@ -1,24 +1,10 @@
-import re
+from utils.urls import parse_url
 
 def validate_url(url):
     """
     Validates if the provided URL is from a supported platform
     (YouTube, TikTok, Instagram, X/Twitter, Reddit, LinkedIn, Facebook).
+    The host itself must be a supported domain or a subdomain of one, so
+    lookalikes such as notyoutube.com.evil are rejected.
     """
-    if not url:
-        return False
-    
-    # Simple domain check is often more robust than complex regexes for this purpose
-    # as platforms have many URL variations (shortlinks, mobile subs, etc.)
-    supported_domains = [
-        "youtube.com", "youtu.be",
-        "tiktok.com",
-        "instagram.com",
-        "twitter.com", "x.com",
-        "reddit.com",
-        "linkedin.com",
-        "facebook.com", "fb.watch"
-    ]
-    
-    url_lower = url.lower()
-    return any(domain in url_lower for domain in supported_domains)
+    return parse_url(url) is not None